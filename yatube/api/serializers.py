@@ -0,0 +1,53 @@
+from operator import attrgetter
+
+POST_FIELDS = {
+    'id': attrgetter('pk'),
+    'text': attrgetter('text'),
+    'pub_date': attrgetter('pub_date'),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'comments_count': attrgetter('comments_count'),
+}
+
+COMMENT_FIELDS = {
+    'id': attrgetter('pk'),
+    'post': attrgetter('post_id'),
+    'author': lambda comment: comment.author.username,
+    'text': attrgetter('text'),
+    'created': attrgetter('created'),
+}
+
+GROUP_FIELDS = {
+    'id': attrgetter('pk'),
+    'title': attrgetter('title'),
+    'slug': attrgetter('slug'),
+    'description': attrgetter('description'),
+    'posts_count': attrgetter('posts_count'),
+}
+
+FOLLOW_FIELDS = {
+    'id': attrgetter('pk'),
+    'user': lambda follow: follow.user.username,
+    'author': lambda follow: follow.author.username,
+}
+
+
+class UnknownField(ValueError):
+    pass
+
+
+def select_fields(fields: str, available: dict) -> dict:
+    """Picks the getters named in a ``?fields=a,b`` parameter."""
+    if not fields:
+        return available
+    getters = {}
+    for name in filter(None, map(str.strip, fields.split(','))):
+        if name not in available:
+            raise UnknownField(name)
+        getters[name] = available[name]
+    return getters
+
+
+def serialize(obj, getters: dict) -> dict:
+    return {name: getter(obj) for name, getter in getters.items()}
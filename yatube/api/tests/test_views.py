@@ -0,0 +1,148 @@
+import json
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = mixer.blend(User, username='author')
+        cls.reader = mixer.blend(User, username='reader')
+        cls.group = mixer.blend('posts.Group', slug='group')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Пост {number}',
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(5)
+        ]
+        Comment.objects.create(
+            author=cls.reader,
+            post=cls.posts[0],
+            text='Комментарий',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.anon = Client()
+        cls.auth = Client()
+        cls.auth.force_login(cls.reader)
+
+    @override_settings(NUMBER_OF_POSTS=2)
+    def test_posts_walk_by_cursor(self):
+        seen = []
+        params = {}
+        while True:
+            response = self.anon.get(reverse('api:posts'), params).json()
+            seen.extend(post['id'] for post in response['results'])
+            if response['next'] is None:
+                break
+            params = {'cursor': response['next']}
+        self.assertEqual(seen, [post.id for post in reversed(self.posts)])
+
+    def test_posts_are_filtered_by_group(self):
+        response = self.anon.get(reverse('api:posts'), {'group': 'group'})
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']],
+            [self.posts[3].id, self.posts[1].id],
+        )
+
+    def test_sparse_fields(self):
+        response = self.anon.get(
+            reverse('api:post_detail', args=(self.posts[0].id,)),
+            {'fields': 'id,author,comments_count'},
+        )
+        self.assertEqual(
+            response.json(),
+            {'id': self.posts[0].id, 'author': 'author', 'comments_count': 1},
+        )
+
+    def test_unknown_field_is_rejected(self):
+        response = self.anon.get(reverse('api:posts'), {'fields': 'secret'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_missing_post_is_json_404(self):
+        response = self.anon.get(reverse('api:post_detail', args=(0,)))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertIn('detail', response.json())
+
+    def test_post_comments(self):
+        response = self.anon.get(
+            reverse('api:post_comments', args=(self.posts[0].id,)),
+        )
+        self.assertEqual(
+            response.json()['results'][0]['text'],
+            'Комментарий',
+        )
+
+    def test_feed_and_follows_need_login(self):
+        for name in ('api:feed', 'api:follows'):
+            with self.subTest(name=name):
+                self.assertEqual(
+                    self.anon.get(reverse(name)).status_code,
+                    HTTPStatus.UNAUTHORIZED,
+                )
+
+    def test_feed_and_follows(self):
+        feed = self.auth.get(reverse('api:feed')).json()
+        self.assertEqual(len(feed['results']), 5)
+        follows = self.auth.get(reverse('api:follows')).json()
+        self.assertEqual(
+            follows['results'],
+            [
+                {
+                    'id': Follow.objects.get().id,
+                    'user': 'reader',
+                    'author': 'author',
+                },
+            ],
+        )
+
+    def test_posts_page_has_fixed_query_count(self):
+        with self.assertNumQueries(1):
+            self.anon.get(reverse('api:posts'))
+
+    def test_batch_ingests_json_lines(self):
+        body = '\n'.join(
+            json.dumps({'type': 'post', 'text': f'Пакетный пост {number}'})
+            for number in range(3)
+        )
+        response = self.auth.post(
+            reverse('api:batch'),
+            body,
+            content_type='application/x-ndjson',
+        )
+        self.assertEqual(response.json()['posts'], 3)
+        self.assertEqual(Post.objects.filter(author=self.reader).count(), 3)
+
+    def test_batch_conflict_is_reported(self):
+        with mock.patch(
+            'posts.ingest._create',
+            side_effect=OperationalError('database is locked'),
+        ):
+            response = self.auth.post(
+                reverse('api:batch'),
+                json.dumps({'type': 'post', 'text': 'Пакетный пост'}),
+                content_type='application/x-ndjson',
+            )
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(response.json()['posts'], 0)
+        self.assertFalse(Post.objects.filter(author=self.reader).exists())
+
+    def test_batch_needs_login(self):
+        response = self.anon.post(
+            reverse('api:batch'),
+            '',
+            content_type='application/x-ndjson',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
@@ -0,0 +1,20 @@
+from django.urls import path
+
+from api import views
+from api.apps import ApiConfig
+
+app_name = ApiConfig.name
+
+urlpatterns = [
+    path('posts/', views.posts, name='posts'),
+    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments',
+    ),
+    path('groups/', views.groups, name='groups'),
+    path('feed/', views.feed, name='feed'),
+    path('follows/', views.follows, name='follows'),
+    path('batch/', views.batch, name='batch'),
+]
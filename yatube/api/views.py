@@ -0,0 +1,164 @@
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET, require_POST
+
+from api.serializers import (
+    COMMENT_FIELDS,
+    FOLLOW_FIELDS,
+    GROUP_FIELDS,
+    POST_FIELDS,
+    UnknownField,
+    select_fields,
+    serialize,
+)
+from core.utils import CURSOR_PARAM, FEED_KEYS, KeysetPaginator
+from posts import ingest, timeline
+from posts.models import Follow, Group, Post
+from posts.views import comments_page
+
+ID_KEYS = ('id',)
+
+
+COMPACT_JSON = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def json_response(data, status=HTTPStatus.OK) -> JsonResponse:
+    return JsonResponse(data, status=status, json_dumps_params=COMPACT_JSON)
+
+
+def error(detail: str, status: HTTPStatus) -> JsonResponse:
+    return json_response({'detail': detail}, status)
+
+
+def api_view(view):
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except UnknownField as exc:
+            return error(f'Неизвестное поле: {exc}', HTTPStatus.BAD_REQUEST)
+        except Http404:
+            return error('Не найдено.', HTTPStatus.NOT_FOUND)
+
+    return wrapper
+
+
+def login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error('Нужна авторизация.', HTTPStatus.UNAUTHORIZED)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def keyset_page(request, queryset, per_page, keys=FEED_KEYS):
+    return KeysetPaginator(queryset, per_page, keys).get_page(
+        request.GET.get(CURSOR_PARAM),
+    )
+
+
+def page_response(request, page, available) -> JsonResponse:
+    getters = select_fields(request.GET.get('fields'), available)
+    return json_response(
+        {
+            'results': [serialize(obj, getters) for obj in page],
+            'next': page.next_cursor or None,
+        },
+    )
+
+
+@api_view
+def posts(request: HttpRequest) -> HttpResponse:
+    queryset = Post.objects.for_feed()
+    if 'group' in request.GET:
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    if 'author' in request.GET:
+        queryset = queryset.filter(author__username=request.GET['author'])
+    return page_response(
+        request,
+        keyset_page(request, queryset, settings.NUMBER_OF_POSTS),
+        POST_FIELDS,
+    )
+
+
+@api_view
+def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    getters = select_fields(request.GET.get('fields'), POST_FIELDS)
+    return json_response(serialize(post, getters))
+
+
+@api_view
+def post_comments(request: HttpRequest, post_id: int) -> HttpResponse:
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return page_response(
+        request,
+        comments_page(post_id, request.GET.get(CURSOR_PARAM)),
+        COMMENT_FIELDS,
+    )
+
+
+@api_view
+def groups(request: HttpRequest) -> HttpResponse:
+    return page_response(
+        request,
+        keyset_page(
+            request,
+            Group.objects.all(),
+            settings.NUMBER_OF_POSTS,
+            ID_KEYS,
+        ),
+        GROUP_FIELDS,
+    )
+
+
+@api_view
+@login_required
+def feed(request: HttpRequest) -> HttpResponse:
+    return page_response(
+        request,
+        timeline.FeedPaginator(
+            request.user,
+            settings.NUMBER_OF_POSTS,
+        ).get_page(request.GET.get(CURSOR_PARAM)),
+        POST_FIELDS,
+    )
+
+
+@api_view
+@login_required
+def follows(request: HttpRequest) -> HttpResponse:
+    return page_response(
+        request,
+        keyset_page(
+            request,
+            Follow.objects.filter(user=request.user).select_related(
+                'user',
+                'author',
+            ),
+            settings.NUMBER_OF_POSTS,
+            ID_KEYS,
+        ),
+        FOLLOW_FIELDS,
+    )
+
+
+@require_POST
+@login_required
+def batch(request: HttpRequest) -> HttpResponse:
+    """Creates posts and comments from a JSON Lines body, streamed."""
+    try:
+        report = ingest.ingest(request, user=request.user)
+    except ingest.ConflictError as exc:
+        return json_response(
+            {'detail': 'Конфликт записи, повторите позже.', **exc.report},
+            HTTPStatus.CONFLICT,
+        )
+    return json_response(report)
@@ -0,0 +1,374 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.core.cache.backends import filebased, locmem, memcached
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+try:
+    from django_redis.cache import RedisCache as BaseRedisCache
+except ImportError:
+    BaseRedisCache = None
+
+STATS_PREFIX = 'cache-stats'
+NO_SCOPE = '-'
+
+_MISSING = object()
+_scope = threading.local()
+
+
+def set_scope(name):
+    _scope.name = name
+
+
+def get_scope():
+    return getattr(_scope, 'name', None) or NO_SCOPE
+
+
+class CacheStatsMixin:
+    """Counts hits and misses per view and periodically adds them up in
+    the cache itself, so that every worker reports into the same totals.
+    """
+
+    stats_flush_interval = 10
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._stats_flushed_at = time.monotonic()
+
+    def _record(self, hits, misses):
+        scope = get_scope()
+        with self._stats_lock:
+            self._stats[scope, 'hits'] += hits
+            self._stats[scope, 'misses'] += misses
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        self._record(value is not _MISSING, value is _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        found = super().get_many(keys, version)
+        self._record(len(found), len(keys) - len(found))
+        return found
+
+    def flush_stats(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._stats_flushed_at < (
+            self.stats_flush_interval
+        ):
+            return
+        with self._stats_lock:
+            stats, self._stats = self._stats, Counter()
+            self._stats_flushed_at = now
+        for (scope, kind), count in stats.items():
+            key = f'{STATS_PREFIX}:{scope}:{kind}'
+            if not super().add(key, count, None):
+                try:
+                    super().incr(key, count)
+                except ValueError:
+                    super().set(key, count, None)
+            self._register_scope(scope)
+
+    def _register_scope(self, scope):
+        # Only the first worker to add the marker numbers the scope, and
+        # ``incr`` hands every scope its own slot, so concurrent flushes
+        # never overwrite each other's scopes.
+        if not super().add(f'{STATS_PREFIX}:scope:{scope}', True, None):
+            return
+        super().add(f'{STATS_PREFIX}:scopes', 0, None)
+        slot = super().incr(f'{STATS_PREFIX}:scopes')
+        super().set(f'{STATS_PREFIX}:slot:{slot}', scope, None)
+
+    def _scopes(self):
+        count = super().get(f'{STATS_PREFIX}:scopes', 0)
+        return (
+            super()
+            .get_many(
+                [
+                    f'{STATS_PREFIX}:slot:{slot}'
+                    for slot in range(1, count + 1)
+                ],
+            )
+            .values()
+        )
+
+    def read_stats(self):
+        self.flush_stats(force=True)
+        raw_get = super().get
+        return {
+            scope: {
+                kind: raw_get(f'{STATS_PREFIX}:{scope}:{kind}', 0)
+                for kind in ('hits', 'misses')
+            }
+            for scope in sorted(self._scopes())
+        }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+        scopes = self._scopes()
+        count = super().get(f'{STATS_PREFIX}:scopes', 0)
+        super().delete_many(
+            [
+                f'{STATS_PREFIX}:{scope}:{kind}'
+                for scope in scopes
+                for kind in ('hits', 'misses')
+            ]
+            + [f'{STATS_PREFIX}:scope:{scope}' for scope in scopes]
+            + [f'{STATS_PREFIX}:slot:{slot}' for slot in range(1, count + 1)]
+            + [f'{STATS_PREFIX}:scopes'],
+        )
+
+
+class SQLiteCache(BaseCache):
+    """Cache shared by every process on the host, kept in one SQLite file.
+
+    Works without any external service; WAL mode lets readers proceed
+    while a worker writes, and ``incr`` is atomic across processes.
+    Expired and surplus entries are culled at most every ``CULL_INTERVAL``
+    seconds (an ``OPTIONS`` entry) per process.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._cull_interval = params.get('OPTIONS', {}).get(
+            'CULL_INTERVAL',
+            60,
+        )
+        self._culled_at = time.monotonic()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path,
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _alive(self):
+        return '(expires IS NULL OR expires > ?)', (time.time(),)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache VALUES (?, ?, ?)',
+                (
+                    key,
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self.get_backend_timeout(timeout),
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        condition, params = self._alive()
+        row = (
+            self._connection()
+            .execute(
+                f'SELECT value FROM cache WHERE key = ? AND {condition}',
+                (key, *params),
+            )
+            .fetchone()
+        )
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        for key in keys:
+            self.validate_key(key)
+        if not keys:
+            return {}
+        condition, params = self._alive()
+        rows = (
+            self._connection()
+            .execute(
+                f'SELECT key, value FROM cache WHERE {condition} '
+                f'AND key IN ({", ".join("?" * len(keys))})',
+                (*params, *keys),
+            )
+            .fetchall()
+        )
+        return {keys[key]: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'REPLACE INTO cache VALUES (?, ?, ?)',
+                (
+                    key,
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self.get_backend_timeout(timeout),
+                ),
+            )
+        self._maybe_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append(
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires),
+            )
+        connection = self._connection()
+        with connection:
+            connection.executemany('REPLACE INTO cache VALUES (?, ?, ?)', rows)
+        self._maybe_cull()
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        condition, params = self._alive()
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(
+                f'UPDATE cache SET expires = ? WHERE key = ? AND {condition}',
+                (self.get_backend_timeout(timeout), key, *params),
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                ((key,) for key in keys),
+            )
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        condition, params = self._alive()
+        row = (
+            self._connection()
+            .execute(
+                f'SELECT 1 FROM cache WHERE key = ? AND {condition}',
+                (key, *params),
+            )
+            .fetchone()
+        )
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        condition, params = self._alive()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {condition}',
+                (key, *params),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Connections are kept per thread for the life of the worker.
+        pass
+
+    def _maybe_cull(self):
+        now = time.monotonic()
+        if now - self._culled_at < self._cull_interval:
+            return
+        self._culled_at = now
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?',
+                (time.time(),),
+            )
+            (count,) = connection.execute(
+                'SELECT COUNT(*) FROM cache',
+            ).fetchone()
+            if count > self._max_entries:
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                    'ORDER BY expires IS NULL, expires LIMIT ?)',
+                    (count // self._cull_frequency,),
+                )
+
+
+class LocMemCache(CacheStatsMixin, locmem.LocMemCache):
+    pass
+
+
+class FileBasedCache(CacheStatsMixin, filebased.FileBasedCache):
+    pass
+
+
+class SharedSQLiteCache(CacheStatsMixin, SQLiteCache):
+    pass
+
+
+class MemcachedCache(CacheStatsMixin, memcached.MemcachedCache):
+    pass
+
+
+class PyLibMCCache(CacheStatsMixin, memcached.PyLibMCCache):
+    pass
+
+
+if BaseRedisCache is not None:
+
+    class RedisCache(CacheStatsMixin, BaseRedisCache):
+        pass
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core import sqlstats
+
+
+def apply_pragmas(connection, pragmas) -> None:
+    """Runs ``PRAGMA name=value`` for every item; works with DB-API
+    connections and Django cursors alike.
+    """
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name}={value}')
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection, settings.SQLITE_PRAGMAS)
+
+
+@receiver(connection_created)
+def collect_sql_stats(sender, connection, **kwargs):
+    if settings.SQL_STATS:
+        sqlstats.install(connection)
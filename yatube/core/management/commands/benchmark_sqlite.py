@@ -0,0 +1,143 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post ('
+    'id INTEGER PRIMARY KEY, author_id INTEGER NOT NULL, '
+    'text TEXT NOT NULL, pub_date REAL NOT NULL)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+    'CREATE INDEX post_author ON post (author_id, pub_date)',
+)
+
+READ = (
+    'SELECT id, author_id, text, pub_date FROM post '
+    'WHERE author_id = ? ORDER BY pub_date DESC LIMIT ?'
+)
+
+WRITE = 'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)'
+
+AUTHORS = 100
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает чтение из SQLite при параллельной записи с настройками '
+        'по умолчанию и с SQLITE_PRAGMAS. Работает на временной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=1)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5,
+            help='Секунд на каждый профиль.',
+        )
+        parser.add_argument('--rows', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        profiles = {
+            'default': {},
+            'tuned': settings.SQLITE_PRAGMAS,
+        }
+        for name, pragmas in profiles.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                _populate(path, options['rows'])
+                result = _run(path, pragmas, options)
+            self.stdout.write(
+                f'{name:<8} reads/s={result["reads"] / result["time"]:<10.0f}'
+                f'writes/s={result["writes"] / result["time"]:<8.0f}'
+                f'busy={result["busy"]}',
+            )
+
+
+def _connect(path, pragmas):
+    # The standard module waits 5 s on a locked database; the default
+    # profile keeps that, as Django does.
+    connection = sqlite3.connect(
+        path,
+        isolation_level=None,
+        check_same_thread=False,
+    )
+    apply_pragmas(connection, pragmas)
+    return connection
+
+
+def _populate(path, rows):
+    connection = sqlite3.connect(path)
+    with connection:
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.executemany(
+            WRITE,
+            ((n % AUTHORS, f'Текст поста {n}', n) for n in range(rows)),
+        )
+    connection.close()
+
+
+def _run(path, pragmas, options):
+    counts = {'reads': 0, 'writes': 0, 'busy': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + options['duration']
+
+    def worker(operation):
+        connection = _connect(path, pragmas)
+        done = busy = 0
+        while time.monotonic() < deadline:
+            try:
+                operation(connection)
+                done += 1
+            except sqlite3.OperationalError:
+                busy += 1
+        connection.close()
+        kind = 'reads' if operation is _read else 'writes'
+        with lock:
+            counts[kind] += done
+            counts['busy'] += busy
+
+    threads = [
+        threading.Thread(target=worker, args=(_read,))
+        for _ in range(options['readers'])
+    ] + [
+        threading.Thread(target=worker, args=(_write,))
+        for _ in range(options['writers'])
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts['time'] = time.monotonic() - started
+    return counts
+
+
+def _read(connection):
+    connection.execute(
+        READ,
+        (random.randrange(AUTHORS), settings.NUMBER_OF_POSTS),
+    ).fetchall()
+
+
+def _write(connection):
+    # A write transaction of its own, as a view saving a post takes.
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        connection.execute(
+            WRITE,
+            (random.randrange(AUTHORS), 'Новый пост', time.time()),
+        )
+        connection.execute('COMMIT')
+    except sqlite3.Error:
+        connection.execute('ROLLBACK')
+        raise
@@ -0,0 +1,29 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Показывает число попаданий и промахов кэша по страницам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счётчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        if not hasattr(cache, 'read_stats'):
+            raise CommandError(
+                'Бэкенд кэша не ведёт статистику, '
+                'используйте бэкенды из core.cache_backends.',
+            )
+        for scope, stats in cache.read_stats().items():
+            total = stats['hits'] + stats['misses']
+            ratio = stats['hits'] / total if total else 0
+            self.stdout.write(
+                f'{scope:<32} hits={stats["hits"]:<8} '
+                f'misses={stats["misses"]:<8} ratio={ratio:.1%}',
+            )
+        if options['reset']:
+            cache.reset_stats()
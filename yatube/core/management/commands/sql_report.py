@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+
+from core import sqlstats
+
+ORDERS = {
+    'total': lambda stats: stats['time'],
+    'mean': lambda stats: stats['time'] / stats['calls'],
+    'p99': lambda stats: sqlstats.percentile(stats['buckets'], 0.99),
+    'calls': lambda stats: stats['calls'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает самые затратные запросы к базе по отпечаткам SQL '
+        'со всех процессов: число вызовов, общее, среднее время и p99 '
+        'и планы медленных запросов. Числа строк нет: SQLite не сообщает '
+        'его для SELECT.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument(
+            '--sort',
+            choices=ORDERS,
+            default='total',
+            help='Поле сортировки, по умолчанию общее время.',
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help='Выводить планы медленных запросов.',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Очистить статистику после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        stats = sqlstats.collect()
+        total_time = sum(item['time'] for item in stats.values()) or 1
+        top = sorted(
+            stats.items(),
+            key=lambda item: ORDERS[options['sort']](item[1]),
+            reverse=True,
+        )[: options['top']]
+        self.stdout.write(
+            f'{"calls":>8} {"total, ms":>10} {"share":>6} {"mean, ms":>9} '
+            f'{"p99, ms":>8} {"slow":>5}  query',
+        )
+        for sql, item in top:
+            self.stdout.write(
+                f'{item["calls"]:>8} {item["time"] * 1000:>10.1f} '
+                f'{item["time"] / total_time:>6.1%} '
+                f'{item["time"] / item["calls"] * 1000:>9.2f} '
+                f'{sqlstats.percentile(item["buckets"], 0.99) * 1000:>8.2f} '
+                f'{item["slow"]:>5}  {sql}',
+            )
+            if options['plans'] and item['plan']:
+                for line in item['plan'].splitlines():
+                    self.stdout.write(f'{"":>53}{line}')
+        if options['reset']:
+            sqlstats.reset()
@@ -0,0 +1,237 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 5, 10, 20, 50, 100)
+BYTES = (1_000, 4_000, 16_000, 64_000, 256_000, 1_000_000, 4_000_000)
+
+# Name, help text and bucket bounds of every histogram, by view.
+METRICS = {
+    'request_duration_seconds': ('Время ответа.', SECONDS),
+    'db_queries': ('Число SQL-запросов за ответ.', QUERIES),
+    'db_duration_seconds': ('Время SQL-запросов за ответ.', SECONDS),
+    'template_duration_seconds': ('Время отрисовки шаблонов.', SECONDS),
+    'response_size_bytes': ('Размер ответа.', BYTES),
+}
+PREFIX = 'yatube_'
+# Snapshots not rewritten for this many flush intervals are merged.
+STALE_FLUSHES = 3
+MERGED = 'merged.json'
+
+_lock = threading.Lock()
+_histograms = {}
+_flushed_at = time.monotonic()
+_request = threading.local()
+_process = (None, None)
+# What this process's snapshot holds, and what was merged before it.
+_written = {}
+_base = defaultdict(lambda: defaultdict(list))
+
+
+def _empty(metric):
+    _, buckets = METRICS[metric]
+    # One count per bucket plus +Inf, then the sum of observed values.
+    return [0] * (len(buckets) + 1) + [0]
+
+
+def observe(view: str, **values) -> None:
+    with _lock:
+        for metric, value in values.items():
+            histogram = _histograms.setdefault((metric, view), _empty(metric))
+            histogram[bisect_left(METRICS[metric][1], value)] += 1
+            histogram[-1] += value
+
+
+def start_request() -> None:
+    _request.template_time = 0
+
+
+def add_template_time(seconds: float) -> None:
+    if hasattr(_request, 'template_time'):
+        _request.template_time += seconds
+
+
+def finish_request() -> float:
+    return _request.__dict__.pop('template_time', 0)
+
+
+def _snapshot_path():
+    """This process's snapshot; the random part keeps a reused pid from
+    overwriting the file of a dead process.
+    """
+    global _process
+    if _process[0] != os.getpid():
+        _process = (os.getpid(), uuid.uuid4().hex)
+    return os.path.join(settings.METRICS_DIR, '{}-{}.json'.format(*_process))
+
+
+def _merged_path():
+    return os.path.join(settings.METRICS_DIR, MERGED)
+
+
+def _add(totals, metric, view, histogram):
+    total = totals[metric][view]
+    if not total:
+        total.extend(_empty(metric))
+    for position, value in enumerate(histogram):
+        total[position] += value
+
+
+def flush(force=False) -> None:
+    """Writes this process's totals where ``collect`` finds them, at most
+    every ``METRICS_FLUSH_INTERVAL`` seconds unless ``force`` is set.
+
+    Once ``collect`` has folded the snapshot into the merged totals, only
+    what was observed after it is written.
+    """
+    global _flushed_at, _written
+    now = time.monotonic()
+    if not force and now - _flushed_at < settings.METRICS_FLUSH_INTERVAL:
+        return
+    path = _snapshot_path()
+    with _lock:
+        _flushed_at = now
+        if _written and not os.path.exists(path):
+            for (metric, view), histogram in _written.items():
+                _add(_base, metric, view, histogram)
+        _written = {
+            (metric, view): [
+                count - base
+                for count, base in zip(
+                    histogram,
+                    _base[metric][view] or _empty(metric),
+                )
+            ]
+            for (metric, view), histogram in _histograms.items()
+        }
+        snapshot = [
+            [metric, view, histogram]
+            for (metric, view), histogram in _written.items()
+        ]
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(snapshot, file)
+    os.replace(temporary, path)
+
+
+def reset() -> None:
+    global _written
+    with _lock:
+        _histograms.clear()
+        _base.clear()
+        _written = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        os.remove(path)
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return []
+
+
+def _stale_snapshots():
+    cutoff = time.time() - STALE_FLUSHES * settings.METRICS_FLUSH_INTERVAL
+    stale = []
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*-*.json')):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                stale.append(path)
+        except OSError:
+            continue
+    return stale
+
+
+def _write(path, totals):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(
+            [
+                [metric, view, histogram]
+                for metric, views in totals.items()
+                for view, histogram in views.items()
+            ],
+            file,
+        )
+    os.replace(temporary, path)
+
+
+def _merge_stale():
+    """Folds snapshots not updated for ``STALE_FLUSHES`` flush intervals,
+    those of processes that have exited, into the merged totals, so their
+    counts stay and the number of files does not grow.
+    """
+    stale = _stale_snapshots()
+    if not stale:
+        return
+    with open(os.path.join(settings.METRICS_DIR, 'merge.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        merged = defaultdict(lambda: defaultdict(list))
+        for metric, view, histogram in _read(_merged_path()):
+            _add(merged, metric, view, histogram)
+        for path in stale:
+            # Taken aside first: a process writing a fresh snapshot at the
+            # same moment starts a new file rather than losing counts.
+            taken = f'{path}.merging'
+            try:
+                os.rename(path, taken)
+            except FileNotFoundError:
+                continue
+            for metric, view, histogram in _read(taken):
+                if metric in METRICS:
+                    _add(merged, metric, view, histogram)
+            os.remove(taken)
+        _write(_merged_path(), merged)
+
+
+def collect() -> dict:
+    """Adds up the snapshots of every worker process and the merged totals
+    of exited ones.
+    """
+    flush(force=True)
+    _merge_stale()
+    totals = defaultdict(lambda: defaultdict(list))
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        for metric, view, histogram in _read(path):
+            if metric in METRICS:
+                _add(totals, metric, view, histogram)
+    return totals
+
+
+def _labels(**labels):
+    pairs = ','.join(f'{name}="{value}"' for name, value in labels.items())
+    return f'{{{pairs}}}'
+
+
+def render() -> str:
+    """Histograms in the Prometheus text exposition format."""
+    lines = []
+    for metric, views in sorted(collect().items()):
+        help_text, buckets = METRICS[metric]
+        name = f'{PREFIX}{metric}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for view, histogram in sorted(views.items()):
+            view = view.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), histogram):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{_labels(view=view, le=bound)} '
+                    f'{cumulative}',
+                )
+            lines.append(f'{name}_sum{_labels(view=view)} {histogram[-1]}')
+            lines.append(f'{name}_count{_labels(view=view)} {cumulative}')
+    return '\n'.join(lines) + '\n'
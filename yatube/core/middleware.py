@@ -0,0 +1,214 @@
+import hashlib
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils.http import parse_etags
+
+from core import metrics
+from core.cache import get_versions
+from core.cache_backends import get_scope, set_scope
+from core.routers import use_replicas
+from core.utils import cached_page_number
+
+PAGE_CACHE_HEADER = 'X-Page-Cache'
+PRIMARY_PIN_KEY = '_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REVALIDATION_LOCK_TIMEOUT = 30
+
+
+class CacheStatsMiddleware:
+    """Attributes cache hits and misses to the view serving the request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            set_scope(None)
+            if hasattr(cache, 'flush_stats'):
+                cache.flush_stats()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_scope(request.resolver_match.view_name)
+
+
+class MetricsMiddleware:
+    """Records for the view serving the request its wall time, number and
+    time of SQL queries, template rendering time and response size.
+
+    Has to sit inside ``CacheStatsMiddleware``, which names the view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = {'count': 0, 'time': 0}
+
+        def measure(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries['count'] += 1
+                queries['time'] += time.perf_counter() - started
+
+        metrics.start_request()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(measure),
+                )
+            response = self.get_response(request)
+        values = {
+            'request_duration_seconds': time.perf_counter() - started,
+            'db_queries': queries['count'],
+            'db_duration_seconds': queries['time'],
+            'template_duration_seconds': metrics.finish_request(),
+        }
+        if not response.streaming:
+            values['response_size_bytes'] = len(response.content)
+        metrics.observe(get_scope(), **values)
+        metrics.flush()
+        return response
+
+
+class AnonymousPageCacheMiddleware:
+    """Serves whole pages to visitors without a session from the cache.
+
+    A hit costs a URL resolve and a couple of cache reads: sessions, auth,
+    context processors, templates and the ORM are never reached. Entries
+    are keyed by the cache versions listed for the view in
+    ``PAGE_CACHE_VIEWS``, so model events retire them. An entry older than
+    ``PAGE_CACHE_TIMEOUT`` is served stale for ``PAGE_CACHE_STALE_TIMEOUT``
+    more seconds while a single request renders its replacement.
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.PAGE_CACHE_TIMEOUT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = self.cache_key(request)
+        if key is None:
+            return self.get_response(request)
+        entry = cache.get(key)
+        if entry is not None:
+            if entry['expires'] > time.time():
+                return self.respond(request, entry, 'hit')
+            # Only a GET renders the replacement, so only it takes the lock.
+            if request.method != 'GET' or not cache.add(
+                f'{key}:lock',
+                1,
+                REVALIDATION_LOCK_TIMEOUT,
+            ):
+                return self.respond(request, entry, 'stale')
+        response = self.get_response(request)
+        if request.method == 'GET' and self.is_cacheable(response):
+            cache.set(
+                key,
+                {
+                    'status': response.status_code,
+                    'headers': list(response.items()),
+                    'content': response.content,
+                    'expires': time.time() + settings.PAGE_CACHE_TIMEOUT,
+                },
+                settings.PAGE_CACHE_TIMEOUT
+                + settings.PAGE_CACHE_STALE_TIMEOUT,
+            )
+            cache.delete(f'{key}:lock')
+        response[PAGE_CACHE_HEADER] = 'miss'
+        return response
+
+    def cache_key(self, request):
+        if request.method not in ('GET', 'HEAD') or (
+            settings.SESSION_COOKIE_NAME in request.COOKIES
+        ):
+            return None
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+        if view_name not in settings.PAGE_CACHE_VIEWS:
+            return None
+        # Keyed by the page number rather than the query string, so made-up
+        # query strings can not flood the cache.
+        number = cached_page_number(request, settings.FEED_CACHE_PAGES)
+        if number is None:
+            return None
+        set_scope(view_name)
+        versions = get_versions(*settings.PAGE_CACHE_VIEWS[view_name])
+        path = hashlib.md5(request.path.encode()).hexdigest()
+        return (
+            f'page:{view_name}:{path}:{number}:'
+            f'{"-".join(map(str, versions))}'
+        )
+
+    @staticmethod
+    def is_cacheable(response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
+
+    @staticmethod
+    def respond(request, entry, state):
+        headers = dict(entry['headers'])
+        etag = headers.get('ETag')
+        if etag and etag in parse_etags(
+            request.META.get('HTTP_IF_NONE_MATCH', ''),
+        ):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+        else:
+            response = HttpResponse(entry['content'], status=entry['status'])
+            for header, value in headers.items():
+                response[header] = value
+        response[PAGE_CACHE_HEADER] = state
+        return response
+
+
+class ReplicaMiddleware:
+    """Lets the views in ``REPLICA_VIEWS`` read from replicas.
+
+    After a request that may write, the user's session is pinned to the
+    primary for ``REPLICA_PIN_SECONDS``, so a new post or comment shows up
+    on the next page whatever the replication lag.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replicas(False)
+        if (
+            request.method not in SAFE_METHODS
+            and request.user.is_authenticated
+        ):
+            request.session[PRIMARY_PIN_KEY] = (
+                time.time() + settings.REPLICA_PIN_SECONDS
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        use_replicas(
+            request.method in SAFE_METHODS
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+            and request.session.get(PRIMARY_PIN_KEY, 0) < time.time(),
+        )
@@ -0,0 +1,39 @@
+import random
+import threading
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+def use_replicas(enabled: bool) -> None:
+    _state.replicas = enabled
+
+
+def reads_from_replicas() -> bool:
+    return getattr(_state, 'replicas', False)
+
+
+class ReplicaRouter:
+    """Sends reads to a random database from ``DATABASE_REPLICAS`` while
+    ``use_replicas`` is on for the current thread; everything else,
+    writes included, goes to ``default``. Replicas are never migrated:
+    they receive schema and data from the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and reads_from_replicas():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,295 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+
+# Upper bounds of the timing buckets: 10 µs doubling up to about 40 s.
+BUCKETS = tuple(0.00001 * 2**power for power in range(23))
+PLANNED = ('SELECT', 'WITH')
+# Snapshots not rewritten for this many flush intervals are merged.
+STALE_FLUSHES = 3
+MERGED = 'merged.json'
+
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (
+        re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE),
+        'IN (...)',
+    ),
+    (re.compile(r'\s+'), ' '),
+)
+
+_lock = threading.Lock()
+_stats = {}
+_flushed_at = time.monotonic()
+_local = threading.local()
+_process = (None, None)
+# What this process's snapshot holds, and what was merged before it.
+_written = {}
+_base = {}
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """SQL with literals, placeholders and ``IN`` lists replaced, so every
+    call of the same query shape lands on one line of the report.
+    """
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def _empty():
+    return {
+        'calls': 0,
+        'time': 0,
+        'slow': 0,
+        'buckets': [0] * (len(BUCKETS) + 1),
+        'plan': None,
+    }
+
+
+def record(execute, sql, params, many, context):
+    """Execute wrapper: times the query and adds it to its fingerprint.
+
+    The first slow call of a fingerprint is kept to be explained once the
+    response has gone out, see ``explain_pending``.
+    """
+    if getattr(_local, 'explaining', False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = time.perf_counter() - started
+    slow = (
+        not many
+        and elapsed * 1000 >= settings.SQL_SLOW_QUERY_MS
+        and sql.lstrip()[:6].upper().startswith(PLANNED)
+    )
+    key = fingerprint(sql)
+    with _lock:
+        stats = _stats.setdefault(key, _empty())
+        stats['calls'] += 1
+        stats['time'] += elapsed
+        stats['buckets'][bisect_left(BUCKETS, elapsed)] += 1
+        if slow:
+            stats['slow'] += 1
+            if stats['plan'] is None:
+                stats['plan'] = ''
+                _pending().append(
+                    (key, context['connection'].alias, sql, params),
+                )
+    flush()
+    return result
+
+
+def _pending():
+    if not hasattr(_local, 'pending'):
+        _local.pending = []
+    return _local.pending
+
+
+def explain_pending(**kwargs) -> None:
+    """Explains the slow queries this thread has kept; connected to
+    ``request_finished``, so it runs after the response is sent.
+    """
+    pending = _pending()
+    while pending:
+        key, alias, sql, params = pending.pop()
+        plan = explain(connections[alias], sql, params)
+        with _lock:
+            if key in _stats:
+                _stats[key]['plan'] = plan
+
+
+def explain(connection, sql, params):
+    prefix = (
+        'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    )
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            # The last column holds the readable step on every backend.
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except Exception as exc:
+        return f'EXPLAIN не удался: {exc}'
+    finally:
+        _local.explaining = False
+
+
+def install(connection) -> None:
+    if record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record)
+
+
+def _snapshot_path():
+    """This process's snapshot; the random part keeps a reused pid from
+    overwriting the file of a dead process.
+    """
+    global _process
+    if _process[0] != os.getpid():
+        _process = (os.getpid(), uuid.uuid4().hex)
+    return os.path.join(settings.SQL_STATS_DIR, '{}-{}.json'.format(*_process))
+
+
+def _merged_path():
+    return os.path.join(settings.SQL_STATS_DIR, MERGED)
+
+
+def _add(totals, key, stats):
+    total = totals.setdefault(key, _empty())
+    for field in ('calls', 'time', 'slow'):
+        total[field] += stats[field]
+    for position, count in enumerate(stats['buckets']):
+        total['buckets'][position] += count
+    total['plan'] = stats['plan'] or total['plan']
+
+
+def _since(stats, base):
+    return {
+        'calls': stats['calls'] - base['calls'],
+        'time': stats['time'] - base['time'],
+        'slow': stats['slow'] - base['slow'],
+        'buckets': [
+            count - merged
+            for count, merged in zip(stats['buckets'], base['buckets'])
+        ],
+        'plan': stats['plan'],
+    }
+
+
+def flush(force=False) -> None:
+    """Writes this process's statistics where ``collect`` finds them, at
+    most every ``SQL_STATS_FLUSH_INTERVAL`` seconds unless forced.
+
+    Once ``collect`` has folded the snapshot into the merged totals, only
+    what was recorded after it is written.
+    """
+    global _flushed_at, _written
+    now = time.monotonic()
+    if not force and now - _flushed_at < settings.SQL_STATS_FLUSH_INTERVAL:
+        return
+    path = _snapshot_path()
+    with _lock:
+        _flushed_at = now
+        if not _stats:
+            return
+        if _written and not os.path.exists(path):
+            for key, stats in _written.items():
+                _add(_base, key, stats)
+        _written = {
+            key: _since(stats, _base.get(key) or _empty())
+            for key, stats in _stats.items()
+        }
+        snapshot = json.dumps(_written)
+    os.makedirs(settings.SQL_STATS_DIR, exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(snapshot)
+    os.replace(temporary, path)
+
+
+atexit.register(flush, force=True)
+request_finished.connect(explain_pending)
+
+
+def reset() -> None:
+    global _written
+    with _lock:
+        _stats.clear()
+        _base.clear()
+        _written = {}
+    _pending().clear()
+    for path in glob.glob(os.path.join(settings.SQL_STATS_DIR, '*.json')):
+        os.remove(path)
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _stale_snapshots():
+    cutoff = time.time() - STALE_FLUSHES * settings.SQL_STATS_FLUSH_INTERVAL
+    stale = []
+    for path in glob.glob(os.path.join(settings.SQL_STATS_DIR, '*-*.json')):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                stale.append(path)
+        except OSError:
+            continue
+    return stale
+
+
+def _write(path, totals):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(totals, file)
+    os.replace(temporary, path)
+
+
+def _merge_stale():
+    """Folds snapshots not updated for ``STALE_FLUSHES`` flush intervals,
+    those of processes that have exited, into the merged totals, so their
+    counts stay and the number of files does not grow.
+    """
+    stale = _stale_snapshots()
+    if not stale:
+        return
+    lock_path = os.path.join(settings.SQL_STATS_DIR, 'merge.lock')
+    with open(lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        merged = _read(_merged_path())
+        for path in stale:
+            # Taken aside first: a process writing a fresh snapshot at the
+            # same moment starts a new file rather than losing counts.
+            taken = f'{path}.merging'
+            try:
+                os.rename(path, taken)
+            except FileNotFoundError:
+                continue
+            for key, stats in _read(taken).items():
+                _add(merged, key, stats)
+            os.remove(taken)
+        _write(_merged_path(), merged)
+
+
+def collect() -> dict:
+    """Statistics of every process, by fingerprint, with the merged totals
+    of exited ones.
+    """
+    explain_pending()
+    flush(force=True)
+    _merge_stale()
+    totals = {}
+    for path in glob.glob(os.path.join(settings.SQL_STATS_DIR, '*.json')):
+        for key, stats in _read(path).items():
+            _add(totals, key, stats)
+    return totals
+
+
+def percentile(buckets, share: float) -> float:
+    """Upper bound of the bucket holding the given share of calls."""
+    target = share * sum(buckets)
+    seen = 0
+    for bound, count in zip((*BUCKETS, float('inf')), buckets):
+        seen += count
+        if seen >= target:
+            return bound
+    return 0
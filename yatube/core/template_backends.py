@@ -0,0 +1,30 @@
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django
+
+from core import metrics
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.add_template_time(time.perf_counter() - started)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    """The stock backend, timing every template it renders for
+    ``core.metrics``.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django.reraise(exc, self)
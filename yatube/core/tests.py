@@ -1,6 +1,34 @@
+import json
+import os
+import runpy
+import tempfile
+import time
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import Client, TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import connection, connections
+from django.http import Http404
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from core import metrics, sqlstats
+from core.cache_backends import SharedSQLiteCache, set_scope
+from core.routers import ReplicaRouter, use_replicas
+from core.utils import (
+    KeysetPaginator,
+    NumberedKeysetPaginator,
+    encode_cursor,
+    page_window,
+)
+from posts.models import Post
 
 
 class ViewTestClass(TestCase):
@@ -11,3 +39,511 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class PaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = mixer.blend(get_user_model())
+        mixer.cycle(25).blend(Post, author=author, image='')
+        cls.keyset = KeysetPaginator(Post.objects.all(), 10)
+
+    def test_numbered_pages_are_read_without_count(self):
+        with self.assertNumQueries(1):
+            page = NumberedKeysetPaginator(self.keyset).get_page('2')
+        self.assertEqual(
+            list(page),
+            list(Post.objects.order_by('-pub_date', '-id')[10:20]),
+        )
+        self.assertTrue(page.has_previous())
+        self.assertTrue(page.has_next())
+        self.assertEqual(
+            list(self.keyset.get_page(page.next_cursor)),
+            list(Post.objects.order_by('-pub_date', '-id')[20:]),
+        )
+
+    def test_page_past_the_end_is_not_found(self):
+        with self.assertRaises(Http404):
+            NumberedKeysetPaginator(self.keyset).get_page('1000')
+
+    def test_page_cursor_reads_keys_only(self):
+        with self.assertNumQueries(1) as queries:
+            cursor = self.keyset.page_cursor(3)
+        self.assertNotIn('"text"', queries.captured_queries[0]['sql'])
+        self.assertEqual(
+            list(self.keyset.get_page(cursor)),
+            list(Post.objects.order_by('-pub_date', '-id')[20:]),
+        )
+        self.assertIsNone(self.keyset.page_cursor(4))
+
+    def test_non_scalar_cursor_gives_first_page(self):
+        for values in ([['a'], 1], [{'a': 1}, {}], [1, [2]]):
+            with self.subTest(values=values):
+                page = self.keyset.get_page(encode_cursor(values))
+                self.assertFalse(page.has_previous())
+                self.assertEqual(len(page), 10)
+
+    def test_page_window_is_bounded(self):
+        page = Paginator(range(10_000), 10).get_page(500)
+        self.assertEqual(page_window(page), range(497, 504))
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = SharedSQLiteCache(
+            os.path.join(directory.name, 'cache.sqlite3'),
+            {},
+        )
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertEqual(
+            self.cache.get_many(['key', 'missing']),
+            {
+                'key': {'value': 1},
+            },
+        )
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_does_not_overwrite(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+
+    def test_expired_value_is_missing(self):
+        self.cache.set('key', 1, timeout=0)
+        self.assertNotIn('key', self.cache)
+        self.assertTrue(self.cache.add('key', 2))
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_stats_are_counted(self):
+        self.cache.get('missing')
+        self.cache.set('key', 1)
+        self.cache.get('key')
+        self.assertEqual(
+            self.cache.read_stats(),
+            {'-': {'hits': 1, 'misses': 1}},
+        )
+
+    def test_scopes_of_every_worker_are_kept(self):
+        other = SharedSQLiteCache(self.cache._path, {})
+        for name, backend in (('a', self.cache), ('b', other)):
+            set_scope(name)
+            backend.get('missing')
+        set_scope(None)
+        other.flush_stats(force=True)
+        self.cache.flush_stats(force=True)
+        self.assertEqual(
+            other.read_stats(),
+            {
+                'a': {'hits': 0, 'misses': 1},
+                'b': {'hits': 0, 'misses': 1},
+            },
+        )
+        other.reset_stats()
+        self.assertEqual(self.cache.read_stats(), {})
+
+    def test_cull_waits_for_interval(self):
+        for interval, expected in ((3600, 5), (0, 2)):
+            with self.subTest(interval=interval):
+                backend = SharedSQLiteCache(
+                    self.cache._path,
+                    {
+                        'OPTIONS': {
+                            'MAX_ENTRIES': 2,
+                            'CULL_FREQUENCY': 1,
+                            'CULL_INTERVAL': interval,
+                        },
+                    },
+                )
+                backend.clear()
+                for number in range(5):
+                    backend.set(f'key{number}', number)
+                self.assertEqual(
+                    len(backend.get_many([f'key{n}' for n in range(5)])),
+                    expected,
+                )
+
+
+class CacheSettingsTest(TestCase):
+    def test_unknown_backend_is_reported(self):
+        path = os.path.join(settings.BASE_DIR, 'yatube', 'settings.py')
+        with mock.patch.dict(os.environ, {'YATUBE_CACHE_BACKEND': 'disk'}):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'locmem'):
+                runpy.run_path(path)
+
+
+class CacheStatsMiddlewareTest(TestCase):
+    def test_stats_are_attributed_to_view(self):
+        cache.clear()
+        Client().get('/')
+        stats = cache.read_stats()
+        self.assertIn('posts:index', stats)
+        self.assertGreater(stats['posts:index']['misses'], 0)
+
+
+class AnonymousPageCacheMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_hit_skips_database(self):
+        self.assertEqual(Client().get('/')['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = Client().get('/')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+
+    def test_authenticated_reader_bypasses_cache(self):
+        client = Client()
+        client.force_login(mixer.blend(get_user_model()))
+        client.get('/')
+        self.assertNotIn('X-Page-Cache', client.get('/'))
+
+    def test_query_strings_share_the_page_entry(self):
+        Client().get('/')
+        for query in ('?utm=1', '?page=1', '?page=junk'):
+            with self.subTest(query=query):
+                response = Client().get(f'/{query}')
+                self.assertEqual(response['X-Page-Cache'], 'hit')
+        with override_settings(FEED_CACHE_PAGES=1):
+            Client().get('/?page=2')
+            self.assertNotIn('X-Page-Cache', Client().get('/?page=2'))
+
+    def test_head_of_expired_page_leaves_no_lock(self):
+        Client().get('/')
+        later = time.time() + 120
+        with mock.patch('core.middleware.time.time', return_value=later):
+            self.assertEqual(Client().head('/')['X-Page-Cache'], 'stale')
+            self.assertEqual(Client().get('/')['X-Page-Cache'], 'miss')
+
+    def test_new_post_retires_cached_page(self):
+        Client().get('/')
+        mixer.blend('posts.Post', image='')
+        self.assertEqual(Client().get('/')['X-Page-Cache'], 'miss')
+
+    def test_expired_page_is_served_stale_during_revalidation(self):
+        Client().get('/')
+        later = time.time() + 120
+        with mock.patch('core.middleware.time.time', return_value=later):
+            self.assertEqual(Client().get('/')['X-Page-Cache'], 'miss')
+            self.assertEqual(Client().get('/')['X-Page-Cache'], 'hit')
+        with mock.patch('core.middleware.cache.add', return_value=False):
+            with mock.patch(
+                'core.middleware.time.time',
+                return_value=later + 120,
+            ):
+                response = Client().get('/')
+        self.assertEqual(response['X-Page-Cache'], 'stale')
+
+
+class SQLitePragmasTest(TestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5_000)
+
+    def test_benchmark_reports_both_profiles(self):
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite',
+            '--duration',
+            '0.2',
+            '--rows',
+            '100',
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            [line.split()[0] for line in lines],
+            [
+                'default',
+                'tuned',
+            ],
+        )
+
+
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.addCleanup(use_replicas, False)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_router_reads_from_replicas_only_when_enabled(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(get_user_model()), 'default')
+        use_replicas(True)
+        self.assertEqual(router.db_for_read(get_user_model()), 'replica')
+        self.assertEqual(router.db_for_write(get_user_model()), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertIs(router.allow_migrate('replica', 'posts'), False)
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
+
+    # The test database stands in for the replica, so queries still work.
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_writer_is_pinned_to_primary(self):
+        client = Client()
+        client.force_login(mixer.blend(get_user_model()))
+        post = mixer.blend('posts.Post', image='')
+        with mock.patch(
+            'core.middleware.use_replicas',
+            wraps=use_replicas,
+        ) as switch:
+            client.get(reverse('posts:index'))
+            switch.assert_any_call(True)
+            client.post(
+                reverse('posts:add_comment', args=[post.pk]),
+                {'text': 'Комментарий'},
+            )
+            switch.reset_mock()
+            client.get(reverse('posts:post_detail', args=[post.pk]))
+            switch.assert_any_call(False)
+            self.assertNotIn(mock.call(True), switch.call_args_list)
+
+
+class ReplicaDatabaseTest(TestCase):
+    """Reads through a second alias backed by its own SQLite file."""
+
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.databases['replica'] = {
+            **connections.databases['default'],
+            'NAME': os.path.join(cls.directory.name, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        delattr(connections._connections, 'replica')
+        cls.directory.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(use_replicas, False)
+        mixer.blend('posts.Post', text='Пост на основной базе', image='')
+        Post.objects.using('replica').create(
+            text='Пост на реплике',
+            author=get_user_model()
+            .objects.db_manager('replica')
+            .create(username='replica'),
+        )
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_feed_is_read_from_replica(self):
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Пост на реплике')
+        self.assertNotContains(response, 'Пост на основной базе')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_pinned_session_reads_from_primary(self):
+        client = Client()
+        client.force_login(mixer.blend(get_user_model()))
+        self.assertContains(
+            client.get(reverse('posts:index')),
+            'Пост на реплике',
+        )
+        client.post(
+            reverse('posts:add_comment', args=[Post.objects.first().pk]),
+            {'text': 'Комментарий'},
+        )
+        response = client.get(reverse('posts:index'))
+        self.assertContains(response, 'Пост на основной базе')
+        self.assertNotContains(response, 'Пост на реплике')
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overridden = override_settings(METRICS_DIR=directory.name)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.addCleanup(metrics.reset)
+        metrics.reset()
+        self.client = Client()
+        self.client.force_login(mixer.blend(get_user_model()))
+
+    def test_view_is_measured_and_exported(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(
+            response['Content-Type'],
+            'text/plain; version=0.0.4; charset=utf-8',
+        )
+        content = response.content.decode()
+        for name in metrics.METRICS:
+            self.assertIn(
+                f'yatube_{name}_count{{view="posts:index"}} 1\n',
+                content,
+            )
+        self.assertIn('# TYPE yatube_db_queries histogram', content)
+        self.assertIn(
+            'yatube_db_queries_bucket{view="posts:index",le="0"} 0\n',
+            content,
+        )
+
+    def test_snapshots_of_other_workers_are_added_up(self):
+        metrics.observe('posts:index', db_queries=3)
+        with open(
+            os.path.join(settings.METRICS_DIR, '999999-other.json'),
+            'w',
+            encoding='utf-8',
+        ) as file:
+            json.dump(
+                [
+                    [
+                        'db_queries',
+                        'posts:index',
+                        [0, 0, 0, 2, 0, 0, 0, 0, 0, 6],
+                    ],
+                ],
+                file,
+            )
+        histogram = metrics.collect()['db_queries']['posts:index']
+        self.assertEqual(histogram[3], 3)
+        self.assertEqual(histogram[-1], 9)
+
+    def test_snapshots_of_exited_workers_are_merged(self):
+        path = os.path.join(settings.METRICS_DIR, '999999-exited.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(
+                [
+                    [
+                        'db_queries',
+                        'posts:index',
+                        [0, 2, 0, 0, 0, 0, 0, 0, 0, 2],
+                    ],
+                ],
+                file,
+            )
+        os.utime(path, (0, 0))
+        for _ in range(2):
+            histogram = metrics.collect()['db_queries']['posts:index']
+            self.assertEqual(histogram[1], 2)
+        self.assertFalse(os.path.exists(path))
+
+    def test_idle_worker_is_not_counted_twice_after_merge(self):
+        metrics.observe('posts:index', db_queries=1)
+        metrics.flush(force=True)
+        os.utime(metrics._snapshot_path(), (0, 0))
+        metrics._merge_stale()
+        metrics.observe('posts:index', db_queries=1)
+        histogram = metrics.collect()['db_queries']['posts:index']
+        self.assertEqual(histogram[1], 2)
+
+    def test_endpoint_is_hidden_from_outside(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class SQLStatsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overridden = override_settings(
+            SQL_STATS_DIR=directory.name,
+            SQL_SLOW_QUERY_MS=0,
+        )
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.addCleanup(sqlstats.reset)
+        sqlstats.reset()
+        sqlstats.install(connection)
+        self.addCleanup(connection.execute_wrappers.remove, sqlstats.record)
+
+    def test_fingerprint_hides_literals_and_list_lengths(self):
+        self.assertEqual(
+            sqlstats.fingerprint(
+                "SELECT * FROM t WHERE a = 'x''y' AND b IN (1, 2, 3)\n"
+                'LIMIT 21',
+            ),
+            sqlstats.fingerprint(
+                'SELECT * FROM t WHERE a = %s AND b IN (%s) LIMIT 10',
+            ),
+        )
+
+    def test_queries_are_grouped_and_slow_ones_explained(self):
+        user = mixer.blend(get_user_model())
+        for _ in range(2):
+            get_user_model().objects.filter(pk=user.pk).exists()
+        (stats,) = [
+            stats
+            for sql, stats in sqlstats.collect().items()
+            if sql.startswith('SELECT (?) AS "a" FROM "auth_user"')
+        ]
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['slow'], 2)
+        self.assertIn('auth_user', stats['plan'])
+
+    def test_slow_queries_are_explained_once_after_the_response(self):
+        mixer.blend('posts.Post', image='')
+        client = Client()
+        with mock.patch.object(
+            sqlstats,
+            'explain',
+            wraps=sqlstats.explain,
+        ) as explain:
+            client.get(reverse('posts:index'))
+            explained = explain.call_count
+            self.assertGreater(explained, 0)
+            client.get(reverse('posts:index'))
+        self.assertEqual(explain.call_count, explained)
+        self.assertTrue(
+            any(
+                'posts_post' in (stats['plan'] or '')
+                for stats in sqlstats.collect().values()
+            ),
+        )
+
+    def test_snapshots_of_exited_processes_are_merged(self):
+        path = os.path.join(settings.SQL_STATS_DIR, '999999-exited.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'SELECT ?': {**sqlstats._empty(), 'calls': 2}}, file)
+        os.utime(path, (0, 0))
+        for _ in range(2):
+            self.assertEqual(sqlstats.collect()['SELECT ?']['calls'], 2)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(
+            sorted(os.listdir(settings.SQL_STATS_DIR)),
+            ['merge.lock', 'merged.json'],
+        )
+
+    def test_idle_process_is_not_counted_twice_after_merge(self):
+        get_user_model().objects.count()
+        sqlstats.flush(force=True)
+        os.utime(sqlstats._snapshot_path(), (0, 0))
+        sqlstats._merge_stale()
+        get_user_model().objects.count()
+        (calls,) = [
+            stats['calls']
+            for sql, stats in sqlstats.collect().items()
+            if sql.startswith('SELECT COUNT(*)')
+        ]
+        self.assertEqual(calls, 2)
+
+    def test_report_lists_top_queries(self):
+        get_user_model().objects.count()
+        out = StringIO()
+        call_command('sql_report', '--top', '1', '--sort', 'calls', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('p99, ms', lines[0])
+        self.assertEqual(len(lines), 2)
@@ -1,9 +1,285 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+CURSOR_PARAM = 'cursor'
+FEED_KEYS = ('pub_date', 'id')
+PAGE_WINDOW = 3
 
 
 def truncatechars(chars: str, trim: int) -> str:
     return chars[:trim] + '…' if len(chars) > trim else chars
 
 
-def paginate(request, queryset, objects_count):
-    return Paginator(queryset, objects_count).get_page(request.GET.get('page'))
+def encode_cursor(values, backwards=False):
+    payload = [
+        value.isoformat() if isinstance(value, (date, datetime)) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(
+        json.dumps([int(backwards), payload]).encode(),
+    ).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        backwards, values = json.loads(base64.urlsafe_b64decode(cursor))
+    except (TypeError, ValueError, binascii.Error):
+        return None, False
+    if not isinstance(values, list):
+        return None, False
+    return values, bool(backwards)
+
+
+class CursorPage(Sequence):
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @cached_property
+    def next_cursor(self):
+        if not self._has_next:
+            return ''
+        return self.paginator.cursor_for(self.object_list[-1])
+
+    @cached_property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return ''
+        return self.paginator.cursor_for(self.object_list[0], backwards=True)
+
+
+class KeysetPaginator:
+    """Seek pagination over a queryset ordered by ``keys`` descending.
+
+    Every page is a single ``WHERE (keys) < (cursor) LIMIT n`` range read,
+    so its cost does not depend on how deep the reader has scrolled.
+    """
+
+    def __init__(self, queryset, per_page, keys=FEED_KEYS):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keys = keys
+
+    @cached_property
+    def count(self):
+        return self.queryset.count()
+
+    def cursor_for(self, obj, backwards=False):
+        return encode_cursor(
+            [getattr(obj, key) for key in self.keys],
+            backwards,
+        )
+
+    def page_cursor(self, number):
+        """Cursor of the numbered page ``number``, taken from the last row
+        of the page before it; ``None`` when the page is past the end.
+        """
+        offset = (number - 1) * self.per_page - 1
+        keys = self.keys_at(offset, 2)
+        return encode_cursor(keys[0]) if len(keys) == 2 else None
+
+    def keys_at(self, offset, limit) -> list:
+        """Keys of up to ``limit`` objects from ``offset``; only the keys
+        are read, so skipping rows stays on the index.
+        """
+        ordering = [f'-{key}' for key in self.keys]
+        keys = self.queryset.order_by(*ordering).values_list(*self.keys)
+        end = offset + limit
+        return list(keys[offset:end])
+
+    def rows(self, position, backwards, limit, offset=0) -> list:
+        """Up to ``limit`` objects past ``position`` (or from the top),
+        nearest first, after skipping ``offset`` of them.
+        """
+        queryset = self.queryset
+        if position is not None:
+            queryset = queryset.filter(self._seek(position, backwards))
+        ordering = [key if backwards else f'-{key}' for key in self.keys]
+        end = offset + limit
+        return list(queryset.order_by(*ordering)[offset:end])
+
+    def get_page(self, cursor):
+        values, backwards = decode_cursor(cursor)
+        position = self._to_python(values)
+        object_list = self.rows(position, backwards, self.per_page + 1)
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[: self.per_page]
+        if backwards:
+            object_list.reverse()
+            return CursorPage(object_list, self, True, has_more)
+        return CursorPage(object_list, self, has_more, position is not None)
+
+    def _to_python(self, values):
+        if values is None or len(values) != len(self.keys):
+            return None
+        opts = self.queryset.model._meta
+        try:
+            return [
+                opts.get_field(key).to_python(value)
+                for key, value in zip(self.keys, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            return None
+
+    def _seek(self, position, backwards):
+        lookup = 'gt' if backwards else 'lt'
+        conditions = []
+        for index, key in enumerate(self.keys):
+            equal = dict(zip(self.keys[:index], position[:index]))
+            equal[f'{key}__{lookup}'] = position[index]
+            conditions.append(Q(**equal))
+        return reduce(or_, conditions)
+
+
+class NumberedKeysetPaginator(Paginator):
+    """Page-number access to a keyset feed that never counts it.
+
+    A page reads one row more than it shows to learn whether another one
+    follows, so ``num_pages`` only reaches the page after the current one;
+    the page links on from there by cursor.
+    """
+
+    def __init__(self, keyset):
+        super().__init__(
+            keyset.queryset.order_by(*(f'-{key}' for key in keyset.keys)),
+            keyset.per_page,
+        )
+        self.keyset = keyset
+        self.known_pages = 1
+
+    @property
+    def num_pages(self):
+        return self.known_pages
+
+    def get_page(self, number):
+        """The requested page; a number that is not a number gives the
+        first page, and one past the end is a 404.
+        """
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        rows = self.keyset.rows(
+            None,
+            False,
+            self.per_page + 1,
+            offset=(number - 1) * self.per_page,
+        )
+        if not rows and number > 1:
+            raise Http404('Нет такой страницы.')
+        has_next = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        self.known_pages = number + has_next
+        page = self._get_page(rows, number, self)
+        page.is_cursor = True
+        page.next_cursor = self.keyset.cursor_for(rows[-1]) if has_next else ''
+        page.previous_cursor = (
+            self.keyset.cursor_for(rows[0], backwards=True)
+            if number > 1
+            else ''
+        )
+        return page
+
+
+def paginate(request, queryset, objects_count, keyset=False, keys=FEED_KEYS):
+    if not keyset:
+        page = Paginator(queryset, objects_count).get_page(
+            request.GET.get('page'),
+        )
+        page.page_window = page_window(page)
+        return page
+    return paginate_keyset(
+        request,
+        KeysetPaginator(queryset, objects_count, keys),
+    )
+
+
+def paginate_keyset(request, paginator):
+    if CURSOR_PARAM in request.GET:
+        return paginator.get_page(request.GET.get(CURSOR_PARAM))
+    return NumberedKeysetPaginator(paginator).get_page(request.GET.get('page'))
+
+
+def deep_page_url(request, paginator, pages):
+    """Address of a numbered page past the first ``pages`` by its cursor,
+    or ``None`` for any other request.
+
+    Finding the cursor reads only the keys up to the page, where an
+    ``OFFSET`` read of it would fetch every row above and throw them
+    away. A number past the end is a 404.
+    """
+    if CURSOR_PARAM in request.GET:
+        return None
+    try:
+        number = int(request.GET.get('page', 1))
+    except (TypeError, ValueError):
+        return None
+    if number <= pages:
+        return None
+    cursor = paginator.page_cursor(number)
+    if cursor is None:
+        raise Http404('Нет такой страницы.')
+    query = request.GET.copy()
+    del query['page']
+    query[CURSOR_PARAM] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def cached_page_number(request, pages):
+    """Number of the page a request asks for, if it is one of the first
+    ``pages`` read without a cursor, for cache keys.
+
+    Anything else is ``None`` and should not be cached, so made-up query
+    strings never add cache entries; a malformed number means the first
+    page, as ``NumberedKeysetPaginator`` reads it.
+    """
+    if CURSOR_PARAM in request.GET:
+        return None
+    try:
+        number = max(int(request.GET.get('page', 1)), 1)
+    except (TypeError, ValueError):
+        number = 1
+    return number if number <= pages else None
+
+
+def page_window(page, around=PAGE_WINDOW):
+    """Numbers of the pages linked around ``page``, at most ``around`` on
+    each side, so long feeds do not render a link per page.
+    """
+    return range(
+        max(page.number - around, 1),
+        min(page.number + around, page.paginator.num_pages) + 1,
+    )
@@ -1,8 +1,13 @@
 from http import HTTPStatus
 
-from django.http import HttpRequest
+from django.conf import settings
+from django.http import Http404, HttpRequest, HttpResponse
 from django.shortcuts import render
 
+from core import metrics
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
 
 def page_not_found(request: HttpRequest, exception) -> None:
     del exception
@@ -29,3 +34,12 @@ def server_error(request: HttpRequest):
 def permission_denied(request: HttpRequest, exception):
     del exception
     return render(request, 'core/403.html', status=HTTPStatus.FORBIDDEN)
+
+
+def prometheus_metrics(request: HttpRequest):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        metrics.render(),
+        content_type=PROMETHEUS_CONTENT_TYPE,
+    )
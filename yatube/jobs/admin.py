@@ -0,0 +1,35 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from core.admin import BaseAdmin
+from jobs.models import Job
+
+
+def retry_jobs(modeladmin, request, queryset):
+    queryset.filter(status=Job.FAILED).update(
+        status=Job.QUEUED,
+        attempts=0,
+        run_at=timezone.now(),
+        finished=None,
+    )
+
+
+retry_jobs.short_description = 'Запустить заново'
+
+
+@admin.register(Job)
+class JobAdmin(BaseAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'status',
+        'priority',
+        'run_at',
+        'attempts',
+        'key',
+        'locked_by',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('created', 'finished', 'last_error')
+    actions = (retry_jobs,)
@@ -0,0 +1,37 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди и ставит периодические '
+        'из JOBS_PERIODIC. Останавливается по SIGINT или SIGTERM, '
+        'дождавшись начатых задач.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            help='Число потоков, по умолчанию JOBS_WORKERS.',
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            help='Пауза между опросами пустой очереди, в секундах.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выйти, когда в очереди не останется готовых задач.',
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(options['threads'], options['poll'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(f'Воркер {worker.name}, потоков: {worker.threads}')
+        worker.run(once=options['once'])
@@ -0,0 +1,135 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'name',
+                    models.CharField(max_length=200, verbose_name='задача'),
+                ),
+                (
+                    'args',
+                    models.TextField(default='[]', verbose_name='аргументы'),
+                ),
+                (
+                    'key',
+                    models.CharField(
+                        blank=True,
+                        help_text='Пока задача с этим ключом ждёт в очереди, такая же не добавляется.',
+                        max_length=200,
+                        null=True,
+                        verbose_name='ключ',
+                    ),
+                ),
+                (
+                    'priority',
+                    models.SmallIntegerField(
+                        default=0, verbose_name='приоритет'
+                    ),
+                ),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('queued', 'в очереди'),
+                            ('running', 'выполняется'),
+                            ('done', 'выполнена'),
+                            ('failed', 'не удалась'),
+                        ],
+                        default='queued',
+                        max_length=10,
+                        verbose_name='состояние',
+                    ),
+                ),
+                (
+                    'run_at',
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name='запустить после',
+                    ),
+                ),
+                (
+                    'attempts',
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name='попыток'
+                    ),
+                ),
+                (
+                    'max_attempts',
+                    models.PositiveSmallIntegerField(
+                        default=5, verbose_name='попыток всего'
+                    ),
+                ),
+                (
+                    'locked_by',
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name='воркер'
+                    ),
+                ),
+                (
+                    'locked_until',
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name='занята до'
+                    ),
+                ),
+                (
+                    'last_error',
+                    models.TextField(
+                        blank=True, verbose_name='последняя ошибка'
+                    ),
+                ),
+                (
+                    'created',
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name='создана'
+                    ),
+                ),
+                (
+                    'finished',
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name='завершена'
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'задача',
+                'verbose_name_plural': 'Задачи',
+                'ordering': ('-priority', 'run_at'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(
+                fields=['status', '-priority', 'run_at'],
+                name='job_status_priority',
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(status='queued'),
+                fields=('key',),
+                name='job_queued_key',
+            ),
+        ),
+    ]
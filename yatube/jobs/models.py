@@ -0,0 +1,89 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'в очереди'),
+        (RUNNING, 'выполняется'),
+        (DONE, 'выполнена'),
+        (FAILED, 'не удалась'),
+    )
+    name = models.CharField(verbose_name='задача', max_length=200)
+    args = models.TextField(verbose_name='аргументы', default='[]')
+    key = models.CharField(
+        verbose_name='ключ',
+        max_length=200,
+        null=True,
+        blank=True,
+        help_text='Пока задача с этим ключом ждёт в очереди, такая же '
+        'не добавляется.',
+    )
+    priority = models.SmallIntegerField(
+        verbose_name='приоритет',
+        default=0,
+    )
+    status = models.CharField(
+        verbose_name='состояние',
+        max_length=10,
+        choices=STATUSES,
+        default=QUEUED,
+    )
+    run_at = models.DateTimeField(
+        verbose_name='запустить после',
+        default=timezone.now,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='попыток',
+        default=0,
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='попыток всего',
+        default=5,
+    )
+    locked_by = models.CharField(
+        verbose_name='воркер',
+        max_length=100,
+        blank=True,
+    )
+    locked_until = models.DateTimeField(
+        verbose_name='занята до',
+        null=True,
+        blank=True,
+    )
+    last_error = models.TextField(verbose_name='последняя ошибка', blank=True)
+    created = models.DateTimeField(
+        verbose_name='создана',
+        auto_now_add=True,
+    )
+    finished = models.DateTimeField(
+        verbose_name='завершена',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ('-priority', 'run_at')
+        indexes = (
+            models.Index(
+                fields=('status', '-priority', 'run_at'),
+                name='job_status_priority',
+            ),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('key',),
+                condition=Q(status='queued'),
+                name='job_queued_key',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,251 @@
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (
+    IntegrityError,
+    close_old_connections,
+    connection,
+    transaction,
+)
+from django.db.models import F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def job(priority=0, max_attempts=None):
+    """Marks a function as a job; it is queued and run by its dotted path,
+    and its arguments must be JSON serializable.
+    """
+
+    def register(func):
+        func.job_name = f'{func.__module__}.{func.__qualname__}'
+        func.job_priority = priority
+        func.job_max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        return func
+
+    return register
+
+
+def enqueue(func, args=(), key=None, run_at=None, priority=None) -> None:
+    """Queues a call of a job.
+
+    The row is written in the caller's transaction, so workers only see it
+    once the caller commits, and never see it if the caller rolls back.
+    While a job with the same ``key`` waits in the queue, another one is
+    not added.
+    """
+    Job.objects.bulk_create(
+        [
+            Job(
+                name=func.job_name,
+                args=json.dumps(list(args)),
+                key=key,
+                priority=func.job_priority if priority is None else priority,
+                max_attempts=func.job_max_attempts,
+                run_at=run_at or timezone.now(),
+            ),
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def schedule_periodic(now=None):
+    """Queues the next run of every job in ``JOBS_PERIODIC`` at the next
+    multiple of its interval; the key keeps a single pending run however
+    many workers call this.
+
+    Returns when to call again: the earliest pending periodic run, or
+    ``None`` when there is nothing to schedule.
+    """
+    now = now or timezone.now()
+    keys = []
+    for name, every in settings.JOBS_PERIODIC.items():
+        func = import_string(name)
+        start = math.floor(now.timestamp() / every + 1) * every
+        keys.append(f'periodic:{name}')
+        enqueue(
+            func,
+            key=keys[-1],
+            run_at=now + timedelta(seconds=start - now.timestamp()),
+        )
+    return Job.objects.filter(status=Job.QUEUED, key__in=keys).aggregate(
+        due=Min('run_at'),
+    )['due']
+
+
+def _ready(now):
+    # Running jobs whose lock ran out belong to a worker that died; taking
+    # one over counts as another attempt.
+    return Q(status=Job.QUEUED, run_at__lte=now) | Q(
+        status=Job.RUNNING,
+        locked_until__lt=now,
+        attempts__lt=F('max_attempts'),
+    )
+
+
+def claim(worker: str, limit: int) -> list:
+    """Takes up to ``limit`` due jobs, highest priority first.
+
+    Each job is taken with a conditional update, so when several workers
+    race for it exactly one of them gets it. Jobs whose worker died during
+    the last allowed attempt are marked failed.
+    """
+    now = timezone.now()
+    Job.objects.filter(
+        status=Job.RUNNING,
+        locked_until__lt=now,
+        attempts__gte=F('max_attempts'),
+    ).update(
+        status=Job.FAILED,
+        locked_until=None,
+        last_error='Воркер не завершил последнюю попытку.',
+        finished=now,
+    )
+    candidates = (
+        Job.objects.filter(_ready(now))
+        .order_by('-priority', 'run_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    claimed = [
+        pk
+        for pk in candidates
+        if Job.objects.filter(_ready(now), pk=pk).update(
+            status=Job.RUNNING,
+            locked_by=worker,
+            locked_until=now + timedelta(seconds=settings.JOBS_LOCK_TIMEOUT),
+            attempts=F('attempts') + 1,
+        )
+    ]
+    return list(
+        Job.objects.filter(pk__in=claimed).order_by('-priority', 'run_at'),
+    )
+
+
+def retry_delay(attempt: int) -> float:
+    return min(
+        settings.JOBS_RETRY_DELAY * 2 ** (attempt - 1),
+        settings.JOBS_MAX_RETRY_DELAY,
+    )
+
+
+def run(job: Job) -> None:
+    """Runs a claimed job and records the outcome: done, back in the
+    queue after an exponential delay, or failed for good.
+    """
+    try:
+        func = import_string(job.name)
+        if getattr(func, 'job_name', None) != job.name:
+            raise LookupError(f'{job.name} не объявлена задачей.')
+        func(*json.loads(job.args))
+    except Exception:
+        logger.exception('Задача %s не выполнена', job)
+        _failed(job, traceback.format_exc())
+        return
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status=Job.DONE,
+        locked_until=None,
+        finished=timezone.now(),
+    )
+
+
+def _failed(job, error):
+    now = timezone.now()
+    jobs = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    if job.attempts < job.max_attempts:
+        try:
+            with transaction.atomic():
+                jobs.update(
+                    status=Job.QUEUED,
+                    run_at=now + timedelta(seconds=retry_delay(job.attempts)),
+                    locked_until=None,
+                    last_error=error,
+                )
+            return
+        except IntegrityError:
+            # A newer copy with the same key is queued and will do the work.
+            pass
+    jobs.update(
+        status=Job.FAILED,
+        locked_until=None,
+        last_error=error,
+        finished=now,
+    )
+
+
+@job()
+def prune() -> int:
+    return Job.objects.filter(
+        status=Job.DONE,
+        finished__lt=timezone.now()
+        - timedelta(seconds=settings.JOBS_KEEP_DONE),
+    ).delete()[0]
+
+
+class Worker:
+    """Claims due jobs and runs them on a pool of threads."""
+
+    def __init__(self, threads=None, poll=None):
+        self.threads = threads or settings.JOBS_WORKERS
+        self.poll = settings.JOBS_POLL_INTERVAL if poll is None else poll
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        # When periodic jobs need queueing again; None means right away.
+        self.next_schedule = None
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def schedule(self) -> None:
+        """Queues periodic jobs once the earliest pending run is due; until
+        then there is nothing new to queue.
+        """
+        now = timezone.now()
+        if self.next_schedule is not None and now < self.next_schedule:
+            return
+        self.next_schedule = schedule_periodic(now) or now + timedelta(
+            seconds=self.poll,
+        )
+
+    def run(self, once=False) -> None:
+        """Works until ``stop``; with ``once``, until nothing is due."""
+        running = set()
+        with ThreadPoolExecutor(
+            max_workers=self.threads,
+            thread_name_prefix='jobs',
+        ) as pool:
+            while not self.stopping.is_set():
+                running = {future for future in running if not future.done()}
+                jobs = []
+                self.schedule()
+                if len(running) < self.threads:
+                    jobs = claim(self.name, self.threads - len(running))
+                for claimed in jobs:
+                    running.add(pool.submit(_execute, claimed))
+                if jobs:
+                    continue
+                if running:
+                    wait(running, self.poll, FIRST_COMPLETED)
+                elif once:
+                    break
+                else:
+                    self.stopping.wait(self.poll)
+
+
+def _execute(job):
+    close_old_connections()
+    try:
+        run(job)
+    finally:
+        connection.close()
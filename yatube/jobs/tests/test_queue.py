@@ -0,0 +1,145 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from jobs import queue
+from jobs.models import Job
+
+calls = []
+
+
+@queue.job()
+def record(value):
+    calls.append(value)
+
+
+@queue.job(max_attempts=2)
+def explode():
+    raise RuntimeError('сбой')
+
+
+@queue.job(priority=5)
+def urgent():
+    pass
+
+
+class QueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_key_keeps_one_queued_copy(self):
+        queue.enqueue(record, [1], key='record')
+        queue.enqueue(record, [2], key='record')
+        self.assertEqual(Job.objects.count(), 1)
+        queue.claim('worker', 1)
+        queue.enqueue(record, [3], key='record')
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+
+    def test_claim_takes_due_jobs_by_priority_once(self):
+        queue.enqueue(record, [1])
+        queue.enqueue(urgent)
+        queue.enqueue(
+            record,
+            [2],
+            run_at=timezone.now() + timedelta(minutes=1),
+        )
+        claimed = queue.claim('worker', 10)
+        self.assertEqual(
+            [job.name for job in claimed],
+            [urgent.job_name, record.job_name],
+        )
+        self.assertEqual(queue.claim('other', 10), [])
+
+    def test_job_runs_and_is_done(self):
+        queue.enqueue(record, ['значение'])
+        (job,) = queue.claim('worker', 1)
+        queue.run(job)
+        self.assertEqual(calls, ['значение'])
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_failed_job_is_retried_with_backoff_then_given_up(self):
+        queue.enqueue(explode)
+        before = timezone.now()
+        (job,) = queue.claim('worker', 1)
+        queue.run(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('RuntimeError', job.last_error)
+        self.assertGreaterEqual(
+            job.run_at,
+            before + timedelta(seconds=queue.retry_delay(1)),
+        )
+        Job.objects.update(run_at=timezone.now())
+        (job,) = queue.claim('worker', 1)
+        queue.run(job)
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_job_of_dead_worker_is_reclaimed(self):
+        queue.enqueue(record, [1])
+        queue.claim('dead', 1)
+        self.assertEqual(queue.claim('alive', 1), [])
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        (job,) = queue.claim('alive', 1)
+        self.assertEqual((job.locked_by, job.attempts), ('alive', 2))
+
+    def test_dead_worker_on_last_attempt_fails_the_job(self):
+        queue.enqueue(explode)
+        queue.claim('dead', 1)
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        queue.claim('dead', 1)
+        Job.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(queue.claim('alive', 1), [])
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    @override_settings(JOBS_PERIODIC={'jobs.queue.prune': 60})
+    def test_periodic_job_is_queued_once_at_next_interval(self):
+        now = timezone.now().replace(second=30)
+        queue.schedule_periodic(now)
+        queue.schedule_periodic(now)
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'jobs.queue.prune')
+        self.assertEqual(
+            job.run_at.replace(microsecond=0),
+            now.replace(second=0, microsecond=0) + timedelta(minutes=1),
+        )
+
+    @override_settings(JOBS_PERIODIC={'jobs.queue.prune': 60})
+    def test_worker_schedules_when_the_pending_run_is_due(self):
+        worker = queue.Worker(poll=0)
+        with mock.patch.object(
+            queue,
+            'schedule_periodic',
+            wraps=queue.schedule_periodic,
+        ) as schedule:
+            worker.schedule()
+            worker.schedule()
+            self.assertEqual(schedule.call_count, 1)
+            Job.objects.update(run_at=timezone.now())
+            worker.next_schedule = timezone.now()
+            worker.schedule()
+            self.assertEqual(schedule.call_count, 2)
+        self.assertEqual(worker.next_schedule, Job.objects.get().run_at)
+
+    def test_unregistered_function_is_not_run(self):
+        Job.objects.create(name='os.remove', args='["/"]')
+        (job,) = queue.claim('worker', 1)
+        with mock.patch('os.remove') as remove:
+            queue.run(job)
+        remove.assert_not_called()
+        self.assertIn('LookupError', Job.objects.get().last_error)
+
+
+class WorkerTest(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    @override_settings(JOBS_PERIODIC={})
+    def test_worker_runs_queued_jobs_on_threads(self):
+        for value in range(5):
+            queue.enqueue(record, [value])
+        queue.Worker(threads=2, poll=0.01).run(once=True)
+        self.assertEqual(sorted(calls), list(range(5)))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 5)
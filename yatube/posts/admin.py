@@ -1,9 +1,36 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
 
 from core.admin import BaseAdmin
+from posts import export, search
 from posts.models import Comment, Follow, Group, Post
 
 
+def _export(queryset, name, content_type):
+    response = StreamingHttpResponse(
+        export.FORMATS[name](queryset),
+        content_type=content_type,
+    )
+    response[
+        'Content-Disposition'
+    ] = f'attachment; filename="{queryset.model._meta.model_name}s.{name}"'
+    return response
+
+
+def export_jsonl(modeladmin, request, queryset):
+    return _export(queryset, 'jsonl', 'application/x-ndjson; charset=utf-8')
+
+
+export_jsonl.short_description = 'Выгрузить в JSON Lines'
+
+
+def export_csv(modeladmin, request, queryset):
+    return _export(queryset, 'csv', 'text/csv; charset=utf-8')
+
+
+export_csv.short_description = 'Выгрузить в CSV'
+
+
 @admin.register(Post)
 class PostAdmin(BaseAdmin):
     list_display = (
@@ -16,6 +43,15 @@ class PostAdmin(BaseAdmin):
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    actions = (export_jsonl, export_csv)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return (
+            queryset.filter(pk__in=search.matching_posts(search_term)),
+            False,
+        )
 
 
 @admin.register(Group)
@@ -27,6 +63,7 @@ class GroupAdmin(BaseAdmin):
     )
     search_fields = ('description',)
     list_filter = ('slug',)
+    actions = (export_jsonl, export_csv)
 
 
 @admin.register(Comment)
@@ -39,6 +76,7 @@ class CommentAdmin(BaseAdmin):
     )
     search_fields = ('text',)
     list_filter = ('created',)
+    actions = (export_jsonl, export_csv)
 
 
 @admin.register(Follow)
@@ -49,3 +87,4 @@ class FollowAdmin(BaseAdmin):
     )
     search_fields = ('user', 'author')
     list_filter = ('user', 'author')
+    actions = (export_jsonl, export_csv)
@@ -0,0 +1,474 @@
+import hashlib
+import http.client
+import json
+import math
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+from PIL import Image
+
+from core.utils import KeysetPaginator
+from posts import dataset
+from posts.models import Group, Post, UserStats
+
+MODES = ('inprocess', 'server')
+QUERIES_HEADER = 'X-Queries'
+LATENCIES = ('p50_ms', 'p95_ms', 'p99_ms')
+# Latencies compared with the baseline; p99 of a few hundred requests
+# rests on a couple of samples and is only reported.
+COMPARED_LATENCIES = ('p50_ms', 'p95_ms')
+
+
+class Scenario:
+    """A request to one view: a GET, or a POST of ``data(targets, number)``
+    sent as a form; ``args`` and ``query`` name entries of the targets.
+    """
+
+    def __init__(self, name, view, args=(), query='', data=None):
+        self.name = name
+        self.view = view
+        self.args = args
+        self.query = query
+        self.data = data
+        self.status = 200 if data is None else 302
+
+    def path(self, targets) -> str:
+        path = reverse(self.view, args=[targets[arg] for arg in self.args])
+        return f'{path}?{self.query.format(**targets)}' if self.query else path
+
+    def request(self, targets, number) -> tuple:
+        if self.data is None:
+            return 'GET', self.path(targets), b''
+        return (
+            'POST',
+            self.path(targets),
+            encode_multipart(
+                BOUNDARY,
+                {
+                    **self.data(targets, number),
+                    'csrfmiddlewaretoken': targets['csrf'],
+                },
+            ),
+        )
+
+
+def _image(number):
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), (number % 256, 96, 160)).save(
+        buffer,
+        'JPEG',
+        quality=80,
+    )
+    return SimpleUploadedFile(
+        f'benchmark-{number}.jpg',
+        buffer.getvalue(),
+        'image/jpeg',
+    )
+
+
+def _post(targets, number):
+    return {
+        'text': f'Пост для замера {number}',
+        'group': targets['group_id'],
+        'image': _image(number),
+    }
+
+
+def _comment(targets, number):
+    return {'text': f'Комментарий для замера {number}'}
+
+
+SCENARIOS = (
+    Scenario('index', 'posts:index'),
+    Scenario('index_deep', 'posts:index', query='cursor={deep_cursor}'),
+    Scenario('group_list', 'posts:group_list', args=('group',)),
+    Scenario('profile', 'posts:profile', args=('author',)),
+    Scenario('post_detail', 'posts:post_detail', args=('post',)),
+    Scenario('follow_index', 'posts:follow_index'),
+    Scenario('post_create', 'posts:post_create', data=_post),
+    Scenario(
+        'add_comment',
+        'posts:add_comment',
+        args=('post',),
+        data=_comment,
+    ),
+)
+
+
+def find_targets() -> dict:
+    """The heaviest entries of the dataset: the reader following the most
+    authors, the biggest group, the most prolific author, the most
+    commented post and the cursor of a page 90% of the way down the feed,
+    where a deep page number redirects.
+    """
+    reader = UserStats.objects.select_related('user').order_by(
+        '-following_count',
+        'pk',
+    )[0]
+    group = Group.objects.order_by('-posts_count', 'pk')[0]
+    author = UserStats.objects.select_related('user').order_by(
+        '-posts_count',
+        'pk',
+    )[0]
+    pages = math.ceil(Post.objects.count() / settings.NUMBER_OF_POSTS)
+    feed = KeysetPaginator(Post.objects.all(), settings.NUMBER_OF_POSTS)
+    return {
+        'user': reader.user,
+        'group': group.slug,
+        'group_id': group.pk,
+        'author': author.user.username,
+        'post': Post.objects.order_by('-comments_count', 'pk')[0].pk,
+        'deep_cursor': feed.page_cursor(max(pages * 9 // 10, 2)) or '',
+    }
+
+
+def login(user) -> dict:
+    """Session and CSRF cookies of ``user``, for any kind of client."""
+    client = Client(enforce_csrf_checks=True)
+    client.force_login(user)
+    client.get(reverse('posts:post_create'))
+    return {name: morsel.value for name, morsel in client.cookies.items()}
+
+
+@contextmanager
+def counting_queries():
+    """Counts the SQL queries of this thread on every database."""
+    queries = {'count': 0}
+
+    def count(execute, sql, params, many, context):
+        queries['count'] += 1
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(count))
+        yield queries
+
+
+class InProcessClient:
+    """Calls the handler stack directly, in the calling thread."""
+
+    def __init__(self, cookies):
+        self.client = Client(enforce_csrf_checks=True)
+        for name, value in cookies.items():
+            self.client.cookies[name] = value
+
+    def send(self, method, path, body) -> tuple:
+        with counting_queries() as queries:
+            response = self.client.generic(
+                method,
+                path,
+                body,
+                MULTIPART_CONTENT,
+            )
+        return response.status_code, queries['count']
+
+    def close(self):
+        pass
+
+
+class _Connection(http.client.HTTPConnection):
+    def connect(self):
+        super().connect()
+        # Small requests must not wait on Nagle for the server's ACK.
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class HTTPClient:
+    """Talks to a server over a kept-alive HTTP connection; the number of
+    queries comes back in a header set by ``counted``.
+    """
+
+    def __init__(self, address, cookies):
+        self.connection = _Connection(*address)
+        self.cookie = '; '.join(
+            f'{name}={value}' for name, value in cookies.items()
+        )
+
+    def send(self, method, path, body) -> tuple:
+        headers = {'Cookie': self.cookie}
+        if body:
+            headers['Content-Type'] = MULTIPART_CONTENT
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status, int(response.getheader(QUERIES_HEADER, 0))
+
+    def close(self):
+        self.connection.close()
+
+
+def counted(application):
+    """Wraps a WSGI application to report each response's query count."""
+
+    def wrapper(environ, start_response):
+        def start(status, headers, exc_info=None):
+            headers = [*headers, (QUERIES_HEADER, str(queries['count']))]
+            return start_response(status, headers, exc_info)
+
+        with counting_queries() as queries:
+            return application(environ, start)
+
+    return wrapper
+
+
+class _QuietHandler(WSGIRequestHandler):
+    # Responses go out in several writes; without TCP_NODELAY the last one
+    # waits for a delayed ACK, about 40 ms on Linux.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve():
+    """Runs the project on a threaded local server; yields its address."""
+    server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler)
+    server.set_app(counted(get_wsgi_application()))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.server_address
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def percentile(ordered, share: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+def summarize(samples, elapsed: float) -> dict:
+    """Figures of ``(seconds, queries, ok)`` samples taken in ``elapsed``."""
+    latencies = sorted(seconds for seconds, _, _ in samples)
+    shares = dict(zip(LATENCIES, (0.5, 0.95, 0.99)))
+    return {
+        'requests': len(samples),
+        'errors': sum(not ok for _, _, ok in samples),
+        'throughput': round(len(samples) / elapsed, 1),
+        **{
+            name: round(percentile(latencies, share) * 1000, 2)
+            for name, share in shares.items()
+        },
+        'queries': round(
+            sum(queries for _, queries, _ in samples) / len(samples),
+            1,
+        ),
+    }
+
+
+def measure(scenario, targets, clients, requests, warmup=0) -> dict:
+    """Sends ``requests`` requests of a scenario spread over ``clients``,
+    each client in a thread of its own, after ``warmup`` untimed ones.
+    """
+    for number in range(warmup):
+        clients[0].send(*scenario.request(targets, number))
+    pending = [
+        scenario.request(targets, number)
+        for number in range(warmup, warmup + requests)
+    ]
+    pending.reverse()
+    samples = []
+    lock = threading.Lock()
+
+    def work(client):
+        while True:
+            with lock:
+                if not pending:
+                    return
+                request = pending.pop()
+            started = time.perf_counter()
+            status, queries = client.send(*request)
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append((elapsed, queries, status == scenario.status))
+
+    started = time.perf_counter()
+    if len(clients) == 1:
+        work(clients[0])
+    else:
+        threads = [
+            threading.Thread(target=work, args=(client,)) for client in clients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return summarize(samples, time.perf_counter() - started)
+
+
+@contextmanager
+def clients(mode, concurrency, cookies):
+    """``concurrency`` clients of the given mode, ready to ``send``."""
+    with ExitStack() as stack:
+        if mode == 'server':
+            address = stack.enter_context(serve())
+            opened = [HTTPClient(address, cookies) for _ in range(concurrency)]
+        else:
+            opened = [InProcessClient(cookies) for _ in range(concurrency)]
+        try:
+            yield opened
+        finally:
+            for client in opened:
+                client.close()
+
+
+@override_settings(DEBUG=False)
+def run(scenarios, mode, concurrency, requests, warmup) -> dict:
+    """Figures of every scenario, by name, against the current database.
+
+    Pages are served as in production: without ``DEBUG``, and so without
+    the debug toolbar and its query log.
+    """
+    targets = find_targets()
+    cookies = login(targets['user'])
+    targets['csrf'] = cookies[settings.CSRF_COOKIE_NAME]
+    with clients(mode, concurrency, cookies) as opened:
+        return {
+            scenario.name: measure(
+                scenario,
+                targets,
+                opened,
+                requests,
+                warmup,
+            )
+            for scenario in scenarios
+        }
+
+
+def compare(results, baseline, tolerance) -> list:
+    """Lines describing where ``results`` fell behind ``baseline``.
+
+    Throughput and latencies may drift by ``tolerance`` (a share of the
+    baseline figure); the number of queries and errors may not grow at
+    all.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['throughput'] < expected['throughput'] * (1 - tolerance):
+            regressions.append(
+                f'{name}: throughput {result["throughput"]} req/s, '
+                f'было {expected["throughput"]}',
+            )
+        for field in COMPARED_LATENCIES:
+            if result[field] > expected[field] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: {field} {result[field]}, '
+                    f'было {expected[field]}',
+                )
+        for field in ('queries', 'errors'):
+            if result[field] > expected[field]:
+                regressions.append(
+                    f'{name}: {field} {result[field]}, '
+                    f'было {expected[field]}',
+                )
+    return regressions
+
+
+@contextmanager
+def _database(path):
+    settings_dict = connection.settings_dict
+    original = settings_dict['NAME']
+    connection.close()
+    # The dictionary is shared with connections other threads open.
+    settings_dict['NAME'] = path
+    try:
+        yield
+    finally:
+        connection.close()
+        settings_dict['NAME'] = original
+
+
+def _template() -> str:
+    """Directory holding the database and media of ``BENCHMARK_DATASET``;
+    built on first use, it is reused while the dataset settings stay the
+    same.
+    """
+    params = json.dumps(settings.BENCHMARK_DATASET, sort_keys=True)
+    digest = hashlib.sha1(params.encode()).hexdigest()[:12]
+    directory = os.path.join(settings.BENCHMARK_DIR, f'dataset-{digest}')
+    if os.path.isdir(directory):
+        return directory
+    building = f'{directory}.tmp'
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    with _database(os.path.join(building, 'db.sqlite3')), isolated(building):
+        call_command('migrate', verbosity=0)
+        dataset.generate(**settings.BENCHMARK_DATASET)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    os.replace(building, directory)
+    return directory
+
+
+def _cache(directory) -> dict:
+    """The project's cache with its files in ``directory``; caches kept by
+    a server of their own become a local-memory one, so the run neither
+    reads nor wipes live entries.
+    """
+    cache_settings = dict(settings.CACHES['default'])
+    for name in ('file', 'sqlite'):
+        backend, location = settings.CACHE_BACKENDS[name]
+        if cache_settings['BACKEND'] == backend:
+            cache_settings['LOCATION'] = os.path.join(
+                directory,
+                os.path.basename(location),
+            )
+            return cache_settings
+    return {
+        'BACKEND': settings.CACHE_BACKENDS['locmem'][0],
+        'LOCATION': 'benchmark',
+    }
+
+
+def isolated(directory):
+    """Settings that keep media, cache, metrics and SQL statistics of a
+    run in ``directory``; SQL statistics are off, as their EXPLAINs would
+    be counted as queries of the pages.
+    """
+    return override_settings(
+        MEDIA_ROOT=os.path.join(directory, 'media'),
+        CACHES={'default': _cache(directory)},
+        METRICS_DIR=os.path.join(directory, 'metrics'),
+        SQL_STATS=False,
+        SQL_STATS_DIR=os.path.join(directory, 'sqlstats'),
+    )
+
+
+@contextmanager
+def dataset_copy():
+    """Points the project at a fresh copy of the benchmark dataset, with
+    its own media directory, an empty cache of its own and its own
+    metrics, so every run starts from the same state. SQLite only.
+    """
+    template = _template()
+    with tempfile.TemporaryDirectory() as temporary:
+        # copytree wants a directory that does not exist yet.
+        directory = os.path.join(temporary, 'dataset')
+        shutil.copytree(template, directory)
+        with _database(os.path.join(directory, 'db.sqlite3')):
+            with isolated(directory):
+                call_command('migrate', verbosity=0)
+                cache.clear()
+                yield
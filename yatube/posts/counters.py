@@ -0,0 +1,79 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from jobs.queue import job
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _add(queryset, field, delta):
+    return queryset.update(**{field: F(field) + delta})
+
+
+def add_user(user_id, field, delta=1):
+    _add(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def add_group(group_id, delta=1):
+    if group_id is not None:
+        _add(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def add_post(post_id, delta=1):
+    _add(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def _count(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count'),
+        ),
+        0,
+    )
+
+
+def _reconcile(queryset, **counters):
+    drifted = queryset.annotate(
+        **{f'actual_{field}': expr for field, expr in counters.items()},
+    ).filter(
+        Q(
+            *(~Q(**{field: F(f'actual_{field}')}) for field in counters),
+            _connector=Q.OR,
+        ),
+    )
+    return queryset.filter(pk__in=drifted.values('pk')).update(**counters)
+
+
+def reconcile_users(users=None):
+    users = User.objects.all() if users is None else users
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=pk)
+            for pk in users.filter(stats=None).values_list('pk', flat=True)
+        ),
+        ignore_conflicts=True,
+    )
+    return _reconcile(
+        UserStats.objects.filter(user__in=users),
+        posts_count=_count(Post, 'author'),
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'),
+    )
+
+
+@job()
+def reconcile():
+    return {
+        'users': reconcile_users(),
+        'groups': _reconcile(
+            Group.objects.all(),
+            posts_count=_count(Post, 'group'),
+        ),
+        'posts': _reconcile(
+            Post.objects.all(),
+            comments_count=_count(Comment, 'post'),
+        ),
+    }
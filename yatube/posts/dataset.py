@@ -0,0 +1,328 @@
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from core.cache import (
+    COMMENTS_VERSION,
+    FEED_VERSION,
+    FOLLOW_VERSION,
+    bump_version,
+)
+from posts import importer, search, timeline
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+WORDS = (
+    'сегодня вчера утром вечером город лес река море дом книга кино '
+    'музыка друг кот собака погода дождь солнце снег работа отпуск '
+    'дорога поезд кофе чай ужин завтрак прогулка парк концерт матч '
+    'новость идея проект код тест релиз ошибка победа история фото '
+    'очень снова наконец просто кажется думаю хочу видел читал пишу'
+).split()
+IMAGE_DIR = 'posts/dataset/'
+IMAGE_FILES = 16
+# Dates end here unless ``until`` says otherwise, so a seed always gives
+# the same rows.
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+UNUSABLE_PASSWORD = '!dataset'
+
+
+def zipf_weights(count: int, exponent: float, rng) -> list:
+    """Cumulative weights of a power law over ``count`` items in a random
+    order, so the most active ids are not simply the first ones.
+    """
+    weights = [1 / rank**exponent for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    return list(accumulate(weights))
+
+
+def _insert(model, fields, rows):
+    """Inserts tuples straight through the cursor, ``DATASET_CHUNK_SIZE``
+    per transaction; model instances and signals are skipped on purpose.
+    """
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(name).column for name in fields]
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({", ".join(map(quote, columns))}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))})'
+    )
+    inserted = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, settings.DATASET_CHUNK_SIZE))
+        if not chunk:
+            return inserted
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, chunk)
+        inserted += len(chunk)
+
+
+def _first_id(model):
+    """The id after the last one handed out. SQLite AUTOINCREMENT never
+    reissues an id, even of a deleted row, so its sequence counts too.
+    """
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT seq FROM sqlite_sequence WHERE name = %s',
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            last = max(last, row[0])
+    return last + 1
+
+
+def _images(rng):
+    """A few small JPEG files for posts to share."""
+    names = []
+    for number in range(IMAGE_FILES):
+        buffer = BytesIO()
+        Image.new(
+            'RGB',
+            (960, 540),
+            tuple(rng.randrange(256) for _ in range(3)),
+        ).save(buffer, 'JPEG', quality=70)
+        name = f'{IMAGE_DIR}{number:02}.jpg'
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        names.append(
+            default_storage.save(name, ContentFile(buffer.getvalue())),
+        )
+    return names
+
+
+def _text(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
+
+
+def generate(
+    users,
+    posts,
+    comments,
+    follows,
+    groups,
+    images=0.0,
+    days=365,
+    until=None,
+    seed=0,
+    timelines=False,
+    progress=None,
+):
+    """Adds a synthetic but realistically skewed dataset.
+
+    Posts per author, followers per author, follows per reader, comments
+    per post and posts per group all follow power laws and are spread over
+    ``days`` up to ``until`` (``EPOCH`` by default). The same ``seed`` on
+    the same database gives the same rows. Counters are written as the
+    rows are generated; the new rows are added to the search index, and
+    with ``timelines`` the follow feeds are rebuilt at the end.
+    """
+    rng = random.Random(seed)
+    progress = progress or (lambda kind, count: None)
+    now = (until or EPOCH).replace(microsecond=0)
+    start = now - timedelta(days=days)
+    adapt = connection.ops.adapt_datetimefield_value
+
+    first_user = _first_id(User)
+    user_ids = range(first_user, first_user + users)
+    first_group = _first_id(Group)
+    group_ids = range(first_group, first_group + groups)
+    first_post = _first_id(Post)
+    first_comment = _first_id(Comment)
+
+    post_authors = rng.choices(
+        user_ids,
+        cum_weights=zipf_weights(users, 0.9, rng),
+        k=posts,
+    )
+    group_weights = zipf_weights(groups, 1.0, rng) if groups else None
+    popularity = zipf_weights(users, 1.0, rng)
+    readers = Counter(
+        rng.choices(
+            user_ids,
+            cum_weights=zipf_weights(users, 0.7, rng),
+            k=follows,
+        ),
+    )
+    commented = Counter(
+        rng.choices(
+            range(posts),
+            cum_weights=zipf_weights(posts, 0.9, rng),
+            k=comments,
+        ),
+    )
+    image_names = _images(rng) if images and posts else []
+
+    edges = []
+    for reader in sorted(readers):
+        authors = set(
+            rng.choices(user_ids, cum_weights=popularity, k=readers[reader]),
+        )
+        authors.discard(reader)
+        edges.extend((reader, author) for author in sorted(authors))
+    posts_by_author = Counter(post_authors)
+    followers = Counter(author for _, author in edges)
+    following = Counter(reader for reader, _ in edges)
+
+    joined = adapt(start)
+    progress(
+        'users',
+        _insert(
+            User,
+            (
+                'id',
+                'password',
+                'is_superuser',
+                'username',
+                'first_name',
+                'last_name',
+                'email',
+                'is_staff',
+                'is_active',
+                'date_joined',
+            ),
+            (
+                (
+                    pk,
+                    UNUSABLE_PASSWORD,
+                    False,
+                    f'user{pk}',
+                    '',
+                    '',
+                    '',
+                    False,
+                    True,
+                    joined,
+                )
+                for pk in user_ids
+            ),
+        ),
+    )
+    _insert(
+        UserStats,
+        ('user', 'posts_count', 'followers_count', 'following_count'),
+        (
+            (pk, posts_by_author[pk], followers[pk], following[pk])
+            for pk in user_ids
+        ),
+    )
+
+    post_groups = [
+        rng.choices(group_ids, cum_weights=group_weights)[0]
+        if groups and rng.random() < 0.7
+        else None
+        for _ in range(posts)
+    ]
+    posts_by_group = Counter(post_groups)
+    progress(
+        'groups',
+        _insert(
+            Group,
+            ('id', 'title', 'slug', 'description', 'posts_count'),
+            (
+                (
+                    pk,
+                    f'Группа {pk}',
+                    f'group-{pk}',
+                    _text(rng, 5, 30),
+                    posts_by_group[pk],
+                )
+                for pk in group_ids
+            ),
+        ),
+    )
+
+    # Posts are spread evenly over ``days`` in id order, as on a live
+    # site; comments come within a week of their post.
+    step = (now - start) / max(posts, 1)
+    progress(
+        'posts',
+        _insert(
+            Post,
+            (
+                'id',
+                'text',
+                'pub_date',
+                'author',
+                'group',
+                'image',
+                'thumbnail',
+                'image_variants',
+                'comments_count',
+            ),
+            (
+                (
+                    first_post + index,
+                    _text(rng, 3, 60),
+                    adapt(start + step * (index + rng.random())),
+                    post_authors[index],
+                    post_groups[index],
+                    rng.choice(image_names)
+                    if image_names and rng.random() < images
+                    else '',
+                    '',
+                    '',
+                    commented[index],
+                )
+                for index in range(posts)
+            ),
+        ),
+    )
+    progress(
+        'comments',
+        _insert(
+            Comment,
+            ('id', 'post', 'author', 'text', 'created'),
+            (
+                (
+                    first_comment + number,
+                    first_post + index,
+                    rng.choice(user_ids),
+                    _text(rng, 1, 25),
+                    adapt(
+                        min(
+                            start
+                            + step * (index + 1)
+                            + timedelta(seconds=rng.randrange(7 * 24 * 3600)),
+                            now,
+                        ),
+                    ),
+                )
+                for number, index in enumerate(
+                    index
+                    for index in sorted(commented)
+                    for _ in range(commented[index])
+                )
+            ),
+        ),
+    )
+    first_follow = _first_id(Follow)
+    progress(
+        'follows',
+        _insert(
+            Follow,
+            ('id', 'user', 'author'),
+            (
+                (first_follow + number, reader, author)
+                for number, (reader, author) in enumerate(edges)
+            ),
+        ),
+    )
+    importer.reset_sequences()
+    search.index_from(first_post, first_comment)
+    if timelines:
+        timeline.rebuild()
+    for version in (FEED_VERSION, COMMENTS_VERSION, FOLLOW_VERSION):
+        bump_version(version)
@@ -0,0 +1,111 @@
+import csv
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Comment, Follow, Group, Post
+
+# Record type and exported columns per model: plain values, users by
+# username, everything else by id, so a dump can be loaded elsewhere.
+SPECS = {
+    Group: (
+        'group',
+        {
+            'id': 'id',
+            'title': 'title',
+            'slug': 'slug',
+            'description': 'description',
+        },
+    ),
+    Post: (
+        'post',
+        {
+            'id': 'id',
+            'author': 'author__username',
+            'group': 'group_id',
+            'text': 'text',
+            'pub_date': 'pub_date',
+            'image': 'image',
+        },
+    ),
+    Comment: (
+        'comment',
+        {
+            'id': 'id',
+            'post': 'post_id',
+            'author': 'author__username',
+            'text': 'text',
+            'created': 'created',
+        },
+    ),
+    Follow: (
+        'follow',
+        {
+            'id': 'id',
+            'user': 'user__username',
+            'author': 'author__username',
+        },
+    ),
+}
+
+# Order in which a full dump is written: referenced rows come first.
+MODELS = {
+    'groups': Group,
+    'posts': Post,
+    'comments': Comment,
+    'follows': Follow,
+}
+
+
+def rows(queryset):
+    """Yields tuples straight from the cursor, ``EXPORT_CHUNK_SIZE`` rows
+    at a time, without building model instances.
+    """
+    _, columns = SPECS[queryset.model]
+    return (
+        queryset.order_by('pk')
+        .values_list(*columns.values())
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+
+
+class _Encoder(DjangoJSONEncoder):
+    """Keeps the microseconds ``DjangoJSONEncoder`` cuts off."""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def jsonl(queryset):
+    kind, columns = SPECS[queryset.model]
+    names = list(columns)
+    encoder = _Encoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows(queryset):
+        yield encoder.encode({'type': kind, **dict(zip(names, row))}) + '\n'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(queryset):
+    _, columns = SPECS[queryset.model]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows(queryset):
+        yield writer.writerow(
+            [
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in row
+            ],
+        )
+
+
+FORMATS = {
+    'jsonl': jsonl,
+    'csv': csv_lines,
+}
@@ -1,5 +1,8 @@
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
 
+from posts import thumbnails, uploads
 from posts.models import Comment, Post
 
 
@@ -12,6 +15,51 @@ class PostForm(forms.ModelForm):
             'group': 'Группа, к которой будет относиться пост',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        upload = self.files.get('image')
+        self.image_too_large = upload is not None and (
+            getattr(upload, 'too_large', False)
+            or upload.size > settings.POST_IMAGE_MAX_BYTES
+        )
+        if self.image_too_large:
+            # Never let ImageField open what the upload handler cut short.
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        if self.image_too_large:
+            raise ValidationError(
+                'Файл больше %(limit)s МБ.',
+                code='too_large',
+                params={'limit': settings.POST_IMAGE_MAX_BYTES // 2**20},
+            )
+        image = self.cleaned_data['image']
+        # ImageField leaves the lazily opened picture here: only its header
+        # has been parsed, so the size is known without decoding pixels.
+        header = getattr(image, 'image', None)
+        if header and header.width * header.height > (
+            settings.POST_IMAGE_MAX_PIXELS
+        ):
+            raise ValidationError(
+                'Картинка больше %(limit)s мегапикселей.',
+                code='too_many_pixels',
+                params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10**6},
+            )
+        return image
+
+    def save(self, commit=True):
+        image_changed = 'image' in self.changed_data
+        if image_changed:
+            if self.instance.image:
+                self.instance.image = uploads.downscale(self.instance.image)
+            self.instance.thumbnail = ''
+            self.instance.image_variants = ''
+        post = super().save(commit)
+        if commit and image_changed:
+            thumbnails.schedule(post)
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,233 @@
+import gzip
+import json
+import os
+from collections import Counter, defaultdict
+from contextlib import suppress
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from core.cache import (
+    COMMENTS_VERSION,
+    FEED_VERSION,
+    FOLLOW_VERSION,
+    bump_version,
+)
+from posts import counters, search, timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+# Loading order inside a chunk: referenced rows go first.
+KINDS = ('group', 'post', 'comment', 'follow')
+
+
+class DumpError(ValueError):
+    pass
+
+
+def checkpoint_path(path: str) -> str:
+    return f'{path}.checkpoint'
+
+
+def read_checkpoint(path: str) -> int:
+    try:
+        with open(checkpoint_path(path), encoding='utf-8') as file:
+            return json.load(file)['offset']
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path: str, offset: int) -> None:
+    # Written aside and renamed, so a crash never leaves half a checkpoint.
+    temporary = f'{checkpoint_path(path)}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump({'offset': offset}, file)
+    os.replace(temporary, checkpoint_path(path))
+
+
+def load(path: str, chunk_size=None, restart=False, progress=None):
+    """Loads a JSON Lines dump written by the ``export`` command.
+
+    Every chunk is inserted in its own transaction with
+    ``ignore_conflicts``, so rows that already exist are left alone and a
+    rerun is harmless. After each commit the byte offset is saved next to
+    the dump, and the next run resumes from it unless ``restart`` is set.
+    Counters, timelines and the search index are left to ``rebuild``.
+    """
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    offset = 0 if restart else read_checkpoint(path)
+    opener = gzip.open if path.endswith('.gz') else open
+    loaded = Counter()
+    with opener(path, 'rb') as dump:
+        dump.seek(offset)
+        while True:
+            lines = list(islice(dump, chunk_size))
+            if not lines:
+                break
+            try:
+                with transaction.atomic():
+                    loaded.update(_load_chunk(lines, offset))
+            except IntegrityError as exc:
+                # SQLite checks foreign keys only when the chunk commits.
+                raise DumpError(
+                    f'Блок после байта {offset} ссылается '
+                    f'на отсутствующие записи: {exc}',
+                ) from exc
+            offset = dump.tell()
+            write_checkpoint(path, offset)
+            if progress is not None:
+                progress(loaded)
+    # An empty dump never wrote a checkpoint.
+    with suppress(FileNotFoundError):
+        os.remove(checkpoint_path(path))
+    return loaded
+
+
+def _load_chunk(lines, offset):
+    records = defaultdict(list)
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            records[record['type']].append(record)
+        except (ValueError, KeyError, TypeError) as exc:
+            raise DumpError(
+                f'Некорректная запись после байта {offset}: {line[:80]!r}',
+            ) from exc
+    try:
+        objects = _build(records)
+    except (KeyError, TypeError, ValueError) as exc:
+        raise DumpError(
+            f'Неполная запись в блоке после байта {offset}: {exc!r}',
+        ) from exc
+    loaded = Counter()
+    for kind in KINDS:
+        if objects[kind]:
+            _insert(type(objects[kind][0]), objects[kind])
+            loaded[kind] += len(objects[kind])
+    return loaded
+
+
+def _build(records):
+    users = _users(records)
+    return {
+        'group': [
+            Group(
+                id=record['id'],
+                title=record['title'],
+                slug=record['slug'],
+                description=record['description'],
+            )
+            for record in records['group']
+        ],
+        'post': [
+            Post(
+                id=record['id'],
+                author_id=users[record['author']],
+                group_id=record['group'],
+                text=record['text'],
+                pub_date=parse_datetime(record['pub_date']),
+                image=record.get('image') or '',
+            )
+            for record in records['post']
+        ],
+        'comment': [
+            Comment(
+                id=record['id'],
+                post_id=record['post'],
+                author_id=users[record['author']],
+                text=record['text'],
+                created=parse_datetime(record['created']),
+            )
+            for record in records['comment']
+        ],
+        'follow': [
+            Follow(
+                id=record['id'],
+                user_id=users[record['user']],
+                author_id=users[record['author']],
+            )
+            for record in records['follow']
+        ],
+    }
+
+
+def _users(records):
+    """Maps every username in the chunk to an id, creating accounts that
+    do not exist yet; they get an unusable password.
+    """
+    usernames = {
+        record[field]
+        for kind, fields in (
+            ('post', ('author',)),
+            ('comment', ('author',)),
+            ('follow', ('user', 'author')),
+        )
+        for record in records[kind]
+        for field in fields
+    }
+    users = dict(
+        User.objects.filter(username__in=usernames).values_list(
+            'username',
+            'pk',
+        ),
+    )
+    missing = usernames - users.keys()
+    if missing:
+        User.objects.bulk_create(
+            (
+                User(username=username, password=make_password(None))
+                for username in missing
+            ),
+            ignore_conflicts=True,
+        )
+        users.update(
+            User.objects.filter(username__in=missing).values_list(
+                'username',
+                'pk',
+            ),
+        )
+    return users
+
+
+def _insert(model, objects):
+    """Inserts rows as they are in the dump, skipping existing ones.
+
+    A raw insert, as ``loaddata`` does, stores field values without
+    ``pre_save``, so ``auto_now_add`` fields keep the dump dates.
+    """
+    fields = model._meta.concrete_fields
+    size = max(connection.ops.bulk_batch_size(fields, objects), 1)
+    for start in range(0, len(objects), size):
+        end = start + size
+        model._base_manager._insert(
+            objects[start:end],
+            fields=fields,
+            raw=True,
+            ignore_conflicts=True,
+        )
+
+
+def reset_sequences() -> None:
+    """Moves id sequences past rows inserted with explicit ids."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+            no_style(),
+            [Group, Post, Comment, Follow, User],
+        ):
+            cursor.execute(sql)
+
+
+def rebuild() -> None:
+    """Brings everything derived from the loaded rows up to date."""
+    reset_sequences()
+    with transaction.atomic():
+        counters.reconcile()
+        timeline.rebuild()
+        search.rebuild()
+    for version in (FEED_VERSION, COMMENTS_VERSION, FOLLOW_VERSION):
+        bump_version(version)
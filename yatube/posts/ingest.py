@@ -0,0 +1,205 @@
+import json
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+
+from core.cache import COMMENTS_VERSION, FEED_VERSION, bump_version
+from posts import counters, search, timeline
+from posts.models import Comment, Group, Post, User
+
+KINDS = ('post', 'comment')
+
+
+class RecordError(Exception):
+    pass
+
+
+class ConflictError(Exception):
+    """A chunk clashed with a concurrent writer and was rolled back;
+    ``report`` covers the chunks written before it.
+    """
+
+    def __init__(self, report):
+        super().__init__(report)
+        self.report = report
+
+
+def ingest(lines, user=None, chunk_size=None) -> dict:
+    """Creates posts and comments from JSON Lines records.
+
+    Every chunk is validated with a handful of lookups, written with
+    ``bulk_create`` inside one transaction, and followed by a single update
+    of counters, timelines, the search index and cache versions. Bad lines
+    are skipped and reported with their numbers. A chunk that clashes with
+    a concurrent writer raises ``ConflictError``.
+
+    ``user`` is the uploader: records may name another author only when
+    ``user`` is staff or ``None`` (management commands).
+    """
+    report = {'posts': 0, 'comments': 0, 'errors': []}
+    numbered = enumerate(lines, 1)
+    chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            return report
+        try:
+            _ingest_chunk(chunk, user, report)
+        except (IntegrityError, OperationalError) as exc:
+            raise ConflictError(report) from exc
+
+
+def _ingest_chunk(chunk, user, report):
+    records = _parse(chunk, report)
+    users = dict(
+        User.objects.filter(
+            username__in=_values(records, 'author', str),
+        ).values_list('username', 'pk'),
+    )
+    groups = dict(
+        Group.objects.filter(
+            slug__in=_values(records, 'group', str),
+        ).values_list('slug', 'pk'),
+    )
+    post_ids = set(
+        Post.objects.filter(
+            pk__in=_values(records, 'post', int),
+        ).values_list('pk', flat=True),
+    )
+
+    posts, comments = [], []
+    for number, record in records:
+        try:
+            obj = _build(record, user, users, groups, post_ids)
+            obj.clean_fields(exclude=('author', 'group', 'post', 'image'))
+        except RecordError as exc:
+            report['errors'].append({'line': number, 'error': str(exc)})
+            continue
+        except ValidationError as exc:
+            report['errors'].append(
+                {'line': number, 'error': ' '.join(exc.messages)},
+            )
+            continue
+        (posts if isinstance(obj, Post) else comments).append(obj)
+
+    with transaction.atomic():
+        if posts:
+            _create(Post, posts)
+            _after_posts(posts)
+        if comments:
+            _create(Comment, comments)
+            _after_comments(comments)
+    report['posts'] += len(posts)
+    report['comments'] += len(comments)
+
+
+def _parse(chunk, report):
+    records = []
+    for number, line in chunk:
+        if isinstance(line, bytes):
+            line = line.decode()
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            report['errors'].append({'line': number, 'error': 'Не JSON.'})
+            continue
+        if not isinstance(record, dict) or record.get('type') not in KINDS:
+            report['errors'].append(
+                {'line': number, 'error': 'Нужен type: post или comment.'},
+            )
+            continue
+        records.append((number, record))
+    return records
+
+
+def _values(records, field, kind):
+    return {
+        record[field]
+        for _, record in records
+        if isinstance(record.get(field), kind)
+    }
+
+
+def _build(record, user, users, groups, post_ids):
+    author_id = _author(record, user, users)
+    if record['type'] == 'post':
+        return Post(
+            author_id=author_id,
+            text=record.get('text'),
+            group_id=_group(record, groups),
+        )
+    post_id = record.get('post')
+    if not isinstance(post_id, int) or post_id not in post_ids:
+        raise RecordError('Пост не найден.')
+    return Comment(
+        author_id=author_id,
+        post_id=post_id,
+        text=record.get('text'),
+    )
+
+
+def _author(record, user, users):
+    username = record.get('author')
+    if username is None and user is not None:
+        return user.pk
+    if not isinstance(username, str) or username not in users:
+        raise RecordError('Автор не найден.')
+    if user is not None and not user.is_staff and users[username] != user.pk:
+        raise RecordError('Можно публиковать только от своего имени.')
+    return users[username]
+
+
+def _group(record, groups):
+    slug = record.get('group')
+    if slug is None:
+        return None
+    if not isinstance(slug, str) or slug not in groups:
+        raise RecordError('Группа не найдена.')
+    return groups[slug]
+
+
+def _create(model, objects):
+    if connection.features.can_return_ids_from_bulk_insert:
+        model.objects.bulk_create(
+            objects,
+            batch_size=settings.INGEST_CHUNK_SIZE,
+        )
+        return
+    # SQLite hands out keys itself, one after another within a statement,
+    # and reports only the last one: insert a statement's worth of rows at
+    # a time and count the keys back from it.
+    fields = [field for field in model._meta.concrete_fields if field.column]
+    size = connection.ops.bulk_batch_size(fields, objects)
+    for start in range(0, len(objects), size):
+        end = start + size
+        batch = objects[start:end]
+        model.objects.bulk_create(batch, batch_size=size)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT last_insert_rowid()')
+            (last,) = cursor.fetchone()
+        for pk, obj in enumerate(batch, last - len(batch) + 1):
+            obj.pk = pk
+
+
+def _after_posts(posts):
+    for author_id, count in Counter(post.author_id for post in posts).items():
+        counters.add_user(author_id, 'posts_count', count)
+    for group_id, count in Counter(post.group_id for post in posts).items():
+        counters.add_group(group_id, count)
+    timeline.fan_out_many(posts)
+    search.index_many(posts)
+    transaction.on_commit(lambda: bump_version(FEED_VERSION))
+
+
+def _after_comments(comments):
+    for post_id, count in Counter(
+        comment.post_id for comment in comments
+    ).items():
+        counters.add_post(post_id, count)
+    search.index_many(comments)
+    transaction.on_commit(lambda: bump_version(COMMENTS_VERSION))
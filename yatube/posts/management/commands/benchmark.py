@@ -0,0 +1,121 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import benchmark
+
+SCENARIOS = {scenario.name: scenario for scenario in benchmark.SCENARIOS}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пропускную способность, задержки p50/p95/p99 и число '
+        'SQL-запросов публичных страниц на копии BENCHMARK_DATASET и '
+        'сравнивает их с BENCHMARK_BASELINE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode',
+            choices=benchmark.MODES,
+            default='inprocess',
+            help='Вызывать приложение напрямую или через локальный сервер.',
+        )
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Запросов на сценарий.',
+        )
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=SCENARIOS,
+            help='Сценарий; можно указать несколько, по умолчанию все.',
+        )
+        parser.add_argument('--baseline', default=settings.BENCHMARK_BASELINE)
+        parser.add_argument(
+            '--save',
+            action='store_true',
+            help='Записать результаты в базовую линию.',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Завершиться с ошибкой при регрессиях.',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('Нужны хотя бы один клиент и один запрос.')
+        if settings.DATABASE_REPLICAS:
+            raise CommandError('Замер не работает с репликами.')
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер готовит данные только для SQLite.')
+        key = f'{options["mode"]}-{options["concurrency"]}'
+        scenarios = [
+            SCENARIOS[name] for name in options['scenario'] or SCENARIOS
+        ]
+        with benchmark.dataset_copy():
+            results = benchmark.run(
+                scenarios,
+                options['mode'],
+                options['concurrency'],
+                options['requests'],
+                options['warmup'],
+            )
+        self.report(results)
+
+        baseline = self.load(options['baseline'])
+        if baseline.get('dataset', settings.BENCHMARK_DATASET) != (
+            settings.BENCHMARK_DATASET
+        ):
+            self.stdout.write('Базовая линия снята на других данных.')
+            regressions = []
+        else:
+            regressions = benchmark.compare(
+                results,
+                baseline.get('runs', {}).get(key, {}),
+                settings.BENCHMARK_TOLERANCE,
+            )
+        for line in regressions:
+            self.stdout.write(self.style.ERROR(f'Регрессия {line}'))
+        if options['save']:
+            baseline['dataset'] = settings.BENCHMARK_DATASET
+            baseline.setdefault('runs', {}).setdefault(key, {}).update(
+                results,
+            )
+            self.dump(options['baseline'], baseline)
+            self.stdout.write(f'Базовая линия {key} сохранена.')
+        if regressions and options['check']:
+            raise CommandError(f'Регрессий: {len(regressions)}.')
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"scenario":<14} {"req/s":>8} {"p50, ms":>8} {"p95, ms":>8} '
+            f'{"p99, ms":>8} {"queries":>8} {"errors":>7}',
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<14} {result["throughput"]:>8} '
+                f'{result["p50_ms"]:>8} {result["p95_ms"]:>8} '
+                f'{result["p99_ms"]:>8} {result["queries"]:>8} '
+                f'{result["errors"]:>7}',
+            )
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+
+    def dump(self, path, baseline):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+            file.write('\n')
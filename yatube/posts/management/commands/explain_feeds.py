@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Follow, Post, User
+from posts.query_plans import feed_queries, without_feed_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает планы запросов лент и среднее время их выполнения. '
+        'Сравните вывод с --without-indexes и без него, чтобы увидеть '
+        'переход от полного сканирования к чтению диапазона индекса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--post', type=int, help='id поста-образца')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--without-indexes',
+            action='store_true',
+            help='убрать индексы лент на время замеров (откатывается)',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(group=None)
+        if options['post']:
+            posts = posts.filter(pk=options['post'])
+        post = posts.order_by('pub_date').first()
+        if post is None:
+            raise CommandError('Нет постов с группой для примера.')
+        follow = Follow.objects.filter(author_id=post.author_id).first()
+        reader = follow.user if follow else User.objects.first()
+        if options['without_indexes']:
+            with without_feed_indexes():
+                self.report(post, reader, options['repeat'])
+        else:
+            self.report(post, reader, options['repeat'])
+
+    def report(self, post, reader, repeat):
+        for name, queryset in feed_queries(post, reader).items():
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - started) / repeat
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(f'{elapsed * 1000:.2f} ms\n')
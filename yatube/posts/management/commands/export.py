@@ -0,0 +1,70 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает группы, посты, комментарии и подписки '
+        'в JSON Lines или CSV.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models',
+            nargs='*',
+            help=(
+                f'Что выгрузить: {", ".join(export.MODELS)}; по умолчанию всё.'
+            ),
+        )
+        parser.add_argument(
+            '--format',
+            choices=list(export.FORMATS),
+            default='jsonl',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Сжать вывод gzip.',
+        )
+        parser.add_argument(
+            '-o',
+            '--output',
+            default='-',
+            help='Файл для выгрузки, «-» — стандартный вывод.',
+        )
+
+    def handle(self, *args, **options):
+        names = options['models'] or list(export.MODELS)
+        unknown = set(names) - set(export.MODELS)
+        if unknown:
+            raise CommandError(f'Неизвестные модели: {", ".join(unknown)}')
+        if options['format'] == 'csv' and len(names) > 1:
+            raise CommandError('В CSV выгружается одна модель за раз.')
+        write = export.FORMATS[options['format']]
+        with self.open(options) as output:
+            for name in names:
+                model = export.MODELS[name]
+                output.writelines(write(model.objects.all()))
+
+    def open(self, options):
+        output = options['output']
+        if options['gzip']:
+            return gzip.open(
+                sys.stdout.buffer if output == '-' else output,
+                'wt',
+                encoding='utf-8',
+                newline='',
+            )
+        if output == '-':
+            return open(
+                sys.stdout.fileno(),
+                'w',
+                encoding='utf-8',
+                closefd=False,
+                newline='',
+            )
+        return open(output, 'w', encoding='utf-8', newline='')
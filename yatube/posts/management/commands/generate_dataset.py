@@ -0,0 +1,93 @@
+import time
+from argparse import ArgumentTypeError
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from posts import dataset
+
+
+def parse_until(value):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ArgumentTypeError('Дата задаётся как ГГГГ-ММ-ДД.')
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+class Command(BaseCommand):
+    help = (
+        'Добавляет в базу синтетические данные для нагрузочных проверок: '
+        'пользователей, группы, посты, комментарии и подписки со степенными '
+        'распределениями. Одинаковый --seed даёт одинаковые данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=2_000_000)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=2_000_000,
+            help='Примерное число подписок: повторы отбрасываются.',
+        )
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument(
+            '--images',
+            type=float,
+            default=0,
+            help='Доля постов с картинкой, от 0 до 1.',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько дней распределить посты.',
+        )
+        parser.add_argument(
+            '--until',
+            type=parse_until,
+            help='Дата последнего поста, ГГГГ-ММ-ДД; по умолчанию '
+            f'{dataset.EPOCH:%Y-%m-%d}.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--timelines',
+            action='store_true',
+            help='Заполнить ленты подписок (долго на больших данных).',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 and (options['posts'] or options['comments']):
+            raise CommandError('Для постов и комментариев нужны пользователи.')
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images задаётся долей от 0 до 1.')
+        self.started = time.monotonic()
+        dataset.generate(
+            users=options['users'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            groups=options['groups'],
+            images=options['images'],
+            days=options['days'],
+            until=options['until'],
+            seed=options['seed'],
+            timelines=options['timelines'],
+            progress=self.progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Готово за {time.monotonic() - self.started:.1f} с.',
+            ),
+        )
+
+    def progress(self, kind, count):
+        self.stdout.write(
+            f'{kind}: {count} ({time.monotonic() - self.started:.1f} с)',
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для постов с картинкой, у которых их нет.'
+
+    def handle(self, *args, **options):
+        posts = (
+            Post.objects.exclude(image='')
+            .filter(image_variants='')
+            .values_list('pk', flat=True)
+        )
+        posts = list(posts)
+        for post_id in posts:
+            thumbnails.generate(post_id)
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано постов: {len(posts)}'),
+        )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку команды export (JSON Lines, можно .gz) блоками; '
+        'после сбоя продолжает с последнего сохранённого блока.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Сколько строк вставлять за одну транзакцию.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать с начала файла, не глядя на контрольную точку.',
+        )
+        parser.add_argument(
+            '--no-rebuild',
+            action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            loaded = importer.load(
+                options['path'],
+                chunk_size=options['chunk_size'],
+                restart=options['restart'],
+                progress=self.progress,
+            )
+        except importer.DumpError as exc:
+            raise CommandError(exc) from exc
+        if not options['no_rebuild']:
+            self.stdout.write('Пересчёт счётчиков, лент и индекса…')
+            importer.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Загружено: {self.describe(loaded)}'),
+        )
+
+    def progress(self, loaded):
+        self.stdout.write(f'Обработано: {self.describe(loaded)}')
+
+    @staticmethod
+    def describe(loaded):
+        return ', '.join(f'{kind}: {loaded[kind]}' for kind in importer.KINDS)
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import ingest
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты и комментарии из файла JSON Lines '
+        '(по записи на строку, «-» — стандартный ввод).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Сколько строк записывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            report = ingest.ingest(sys.stdin, chunk_size=options['chunk_size'])
+        else:
+            with open(options['path'], encoding='utf-8') as lines:
+                report = ingest.ingest(
+                    lines,
+                    chunk_size=options['chunk_size'],
+                )
+        for error in report['errors']:
+            self.stderr.write(f'Строка {error["line"]}: {error["error"]}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Постов: {report["posts"]}, '
+                f'комментариев: {report["comments"]}, '
+                f'ошибок: {len(report["errors"])}',
+            ),
+        )
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                upload_to='posts/thumbnails/',
+                verbose_name='миниатюра',
+            ),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:50
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import DatabaseError, migrations, models, transaction
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(
+                    "CREATE VIRTUAL TABLE posts_search USING fts5("
+                    "text, post_id UNINDEXED, "
+                    "tokenize='unicode61 remove_diacritics 2')",
+                )
+        except DatabaseError:
+            pass
+        else:
+            schema_editor.execute(
+                'INSERT INTO posts_search (rowid, text, post_id) '
+                'SELECT id * 2, text, id FROM posts_post',
+            )
+            schema_editor.execute(
+                'INSERT INTO posts_search (rowid, text, post_id) '
+                'SELECT id * 2 + 1, text, post_id FROM posts_comment',
+            )
+            return
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    for model, document, post in (
+        (apps.get_model('posts', 'Post'), 0, 'id'),
+        (apps.get_model('posts', 'Comment'), 1, 'post_id'),
+    ):
+        for obj in model.objects.iterator():
+            words = Counter(
+                word.casefold()[:100] for word in re.findall(r'\w+', obj.text)
+            )
+            SearchTerm.objects.bulk_create(
+                SearchTerm(
+                    term=word,
+                    document=obj.pk * 2 + document,
+                    post_id=getattr(obj, post),
+                    frequency=frequency,
+                    length=sum(words.values()),
+                )
+                for word, frequency in words.items()
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'term',
+                    models.CharField(max_length=100, verbose_name='слово'),
+                ),
+                (
+                    'document',
+                    models.PositiveIntegerField(verbose_name='документ'),
+                ),
+                (
+                    'frequency',
+                    models.PositiveIntegerField(
+                        verbose_name='число вхождений'
+                    ),
+                ),
+                (
+                    'length',
+                    models.PositiveIntegerField(
+                        verbose_name='длина документа'
+                    ),
+                ),
+                (
+                    'post',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='posts.Post',
+                        verbose_name='пост',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'слово поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term'], name='search_term'),
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['document'], name='search_document'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
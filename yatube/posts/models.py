@@ -8,16 +8,42 @@ User = get_user_model()
 MAX_LEN_TITLE = 20
 MAX_LEN_TEXT = 15
 
+FEED_FIELDS = (
+    'text',
+    'pub_date',
+    'image',
+    'thumbnail',
+    'image_variants',
+    'comments_count',
+    'author',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group',
+    'group__title',
+    'group__slug',
+)
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        verbose_name='число постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self) -> str:
         return truncatechars(self.title, MAX_LEN_TITLE)
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='текст поста',
@@ -45,14 +71,63 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True,
     )
+    thumbnail = models.ImageField(
+        verbose_name='миниатюра',
+        upload_to='posts/thumbnails/',
+        blank=True,
+        editable=False,
+    )
+    image_variants = models.TextField(
+        verbose_name='варианты картинки',
+        blank=True,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         default_related_name = 'posts'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date',
+            ),
+        )
 
     def __str__(self) -> str:
         return truncatechars(self.text, MAX_LEN_TEXT)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        return instance
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('author').only(
+            'post',
+            'text',
+            'created',
+            'author',
+            'author__username',
+        )
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -76,9 +151,17 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'комментарий'
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created',
+            ),
+        )
 
     def __str__(self) -> str:
         return self.text
@@ -101,6 +184,98 @@ class Follow(models.Model):
     class Meta:
         verbose_name_plural = 'Подписки'
         verbose_name = 'подписка'
+        unique_together = ('user', 'author')
 
     def __str__(self):
         return f'{self.user} подписался на {self.author}'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='число постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='число подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='число подписок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name_plural = 'Счётчики пользователей'
+        verbose_name = 'счётчики пользователя'
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='автор',
+    )
+    pub_date = models.DateTimeField(verbose_name='дата публикации')
+
+    class Meta:
+        verbose_name_plural = 'Ленты подписок'
+        verbose_name = 'запись ленты'
+        unique_together = ('user', 'post')
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date_post',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
+
+
+class SearchTerm(models.Model):
+    """Inverted index for search where SQLite FTS5 is unavailable."""
+
+    term = models.CharField(verbose_name='слово', max_length=100)
+    document = models.PositiveIntegerField(verbose_name='документ')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='пост',
+    )
+    frequency = models.PositiveIntegerField(verbose_name='число вхождений')
+    length = models.PositiveIntegerField(verbose_name='длина документа')
+
+    class Meta:
+        verbose_name_plural = 'Поисковый индекс'
+        verbose_name = 'слово поискового индекса'
+        indexes = (
+            models.Index(fields=('term',), name='search_term'),
+            models.Index(fields=('document',), name='search_document'),
+        )
+
+    def __str__(self):
+        return self.term
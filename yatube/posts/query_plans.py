@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from posts.models import Comment, Follow, Post, TimelineEntry
+
+
+def feed_queries(post: Post, reader) -> dict:
+    """Querysets shaped like the ones the feed pages run for ``post``."""
+    page = settings.NUMBER_OF_POSTS
+    ordering = ('-pub_date', '-id')
+    return {
+        'index': Post.objects.for_feed().order_by(*ordering)[:page],
+        'index (cursor)': Post.objects.for_feed()
+        .filter(pub_date__lt=post.pub_date)
+        .order_by(*ordering)[:page],
+        'group_list': Post.objects.for_feed()
+        .filter(group_id=post.group_id)
+        .order_by(*ordering)[:page],
+        'profile': Post.objects.for_feed()
+        .filter(author_id=post.author_id)
+        .order_by(*ordering)[:page],
+        'profile (following)': Follow.objects.filter(
+            user=reader,
+            author_id=post.author_id,
+        ),
+        'follow_index': TimelineEntry.objects.filter(user=reader)
+        .select_related('post__author', 'post__group')
+        .order_by('-pub_date', '-post_id')[:page],
+        'follow_index (popular)': Post.objects.for_feed()
+        .filter(author__in=[post.author_id])
+        .order_by(*ordering)[:page],
+        'post_detail (comments)': Comment.objects.filter(post_id=post.pk)
+        .for_listing()
+        .order_by('-created', '-id')[: settings.NUMBER_OF_COMMENTS],
+    }
+
+
+@contextmanager
+def without_feed_indexes():
+    """Drops the feed indexes for the duration of the block and rolls the
+    drop back afterwards, so the plans can be compared with the old ones.
+    """
+    with transaction.atomic():
+        editor = connection.schema_editor(atomic=False)
+        for model in (Post, Comment, TimelineEntry):
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+        try:
+            yield
+        finally:
+            transaction.set_rollback(True)
@@ -0,0 +1,289 @@
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+from math import log
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Count, Sum
+from django.db.models.expressions import RawSQL
+
+from core.utils import CursorPage, decode_cursor, encode_cursor
+from posts.models import Comment, Post, SearchTerm
+
+FTS_TABLE = 'posts_search'
+MAX_TERM_LENGTH = 100
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list:
+    return [
+        token.casefold()[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall(text)
+    ]
+
+
+def uses_fts() -> bool:
+    return settings.SEARCH_FTS and _has_fts_table(
+        connection.alias,
+        connection.settings_dict['NAME'],
+    )
+
+
+@lru_cache(maxsize=None)
+def _has_fts_table(alias, name):
+    return FTS_TABLE in connections[alias].introspection.table_names()
+
+
+def _document(obj) -> tuple:
+    """Posts and comments share one index: even document ids are posts,
+    odd ones are comments, and every document knows the post it leads to.
+    """
+    if isinstance(obj, Comment):
+        return obj.pk * 2 + 1, obj.post_id
+    return obj.pk * 2, obj.pk
+
+
+def index(obj) -> None:
+    index_many([obj], replace=True)
+
+
+def index_many(objects, replace=False) -> None:
+    """Adds posts or comments to the index with one batch of inserts;
+    ``replace`` drops their previous entries first.
+    """
+    documents = [(*_document(obj), obj.text) for obj in objects]
+    if uses_fts():
+        with connection.cursor() as cursor:
+            if replace:
+                cursor.executemany(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                    [[document] for document, _, _ in documents],
+                )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, post_id, text) '
+                f'VALUES (%s, %s, %s)',
+                documents,
+            )
+        return
+    if replace:
+        SearchTerm.objects.filter(
+            document__in=[document for document, _, _ in documents],
+        ).delete()
+    SearchTerm.objects.bulk_create(
+        (term for document in documents for term in _terms(*document)),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+    )
+
+
+def unindex(obj) -> None:
+    document, _ = _document(obj)
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [document],
+            )
+        return
+    SearchTerm.objects.filter(document=document).delete()
+
+
+def _terms(document, post_id, text):
+    frequencies = Counter(tokenize(text))
+    length = sum(frequencies.values())
+    return [
+        SearchTerm(
+            term=term,
+            document=document,
+            post_id=post_id,
+            frequency=frequency,
+            length=length,
+        )
+        for term, frequency in frequencies.items()
+    ]
+
+
+def rebuild() -> None:
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    else:
+        SearchTerm.objects.all().delete()
+    index_from()
+
+
+def index_from(post_id=0, comment_id=0) -> None:
+    """Indexes every post and comment from the given ids on, in bulk."""
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, post_id) '
+                f'SELECT id * 2, text, id FROM posts_post WHERE id >= %s',
+                [post_id],
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, post_id) '
+                f'SELECT id * 2 + 1, text, post_id FROM posts_comment '
+                f'WHERE id >= %s',
+                [comment_id],
+            )
+        return
+    for queryset in (
+        Post.objects.filter(pk__gte=post_id).only('text'),
+        Comment.objects.filter(pk__gte=comment_id).only('text', 'post'),
+    ):
+        for obj in queryset.iterator():
+            SearchTerm.objects.bulk_create(
+                _terms(*_document(obj), obj.text),
+                batch_size=settings.TIMELINE_BATCH_SIZE,
+            )
+
+
+def _match(terms) -> str:
+    # Tokens are \w+ runs, so quoting each makes any input a safe phrase.
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def matching_posts(query: str):
+    """Ids of posts whose text or comments contain every word of
+    ``query``, in a form ``pk__in`` accepts.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    if uses_fts():
+        return RawSQL(
+            f'SELECT post_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [_match(terms)],
+        )
+    return list({post_id for post_id, _ in _score_terms(terms)})
+
+
+def ranked(terms, position=None, backwards=False, limit=None) -> list:
+    """``(post_id, rank)`` pairs, best first: a post ranks by its best
+    matching document, by BM25 (lower is better, as in FTS5).
+    """
+    if not terms:
+        return []
+    if uses_fts():
+        return _ranked_fts(terms, position, backwards, limit)
+    best = {}
+    for post_id, rank in _score_terms(terms):
+        best[post_id] = min(rank, best.get(post_id, rank))
+    rows = sorted(
+        best.items(),
+        key=lambda row: (row[1], row[0]),
+        reverse=backwards,
+    )
+    if position is not None:
+        rows = [
+            (post_id, rank)
+            for post_id, rank in rows
+            if (
+                (rank, post_id) < position
+                if backwards
+                else ((rank, post_id) > position)
+            )
+        ]
+    return rows[:limit]
+
+
+def _ranked_fts(terms, position, backwards, limit):
+    sql = (
+        f'SELECT post_id, MIN(score) AS best FROM ('
+        f'SELECT post_id, rank AS score FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s) GROUP BY post_id'
+    )
+    params = [_match(terms)]
+    if position is not None:
+        sql += f' HAVING (best, post_id) {"<" if backwards else ">"} (%s, %s)'
+        params.extend(position)
+    direction = 'DESC' if backwards else 'ASC'
+    sql += f' ORDER BY best {direction}, post_id {direction}'
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(post_id, rank) for post_id, rank in cursor.fetchall()]
+
+
+def _score_terms(terms):
+    terms = set(terms)
+    stats = SearchTerm.objects.aggregate(
+        documents=Count('document', distinct=True),
+        words=Sum('frequency'),
+    )
+    if not stats['documents']:
+        return
+    average_length = stats['words'] / stats['documents']
+    postings = defaultdict(dict)
+    for term, document, post_id, frequency, length in (
+        SearchTerm.objects.filter(term__in=terms)
+        .values_list('term', 'document', 'post', 'frequency', 'length')
+        .iterator()
+    ):
+        postings[term][document] = (post_id, frequency, length)
+    if len(postings) < len(terms):
+        return
+    documents = set.intersection(*(set(docs) for docs in postings.values()))
+    for document in documents:
+        score = 0
+        for docs in postings.values():
+            post_id, frequency, length = docs[document]
+            idf = max(
+                log(
+                    (stats['documents'] - len(docs) + 0.5) / (len(docs) + 0.5),
+                ),
+                1e-6,
+            )
+            score += idf * (
+                frequency
+                * (BM25_K1 + 1)
+                / (
+                    frequency
+                    + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                )
+            )
+        yield post_id, -score
+
+
+class SearchPaginator:
+    """Cursor pagination over search results ordered by rank."""
+
+    def __init__(self, query, per_page):
+        self.terms = tokenize(query)
+        self.per_page = int(per_page)
+
+    def cursor_for(self, post, backwards=False):
+        return encode_cursor([post.search_rank, post.pk], backwards)
+
+    def get_page(self, cursor):
+        values, backwards = decode_cursor(cursor)
+        position = None
+        if values is not None and len(values) == 2:
+            try:
+                position = (float(values[0]), int(values[1]))
+            except (TypeError, ValueError):
+                pass
+        rows = ranked(self.terms, position, backwards, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _ in rows])
+        object_list = []
+        for pk, rank in rows:
+            if pk in posts:
+                posts[pk].search_rank = rank
+                object_list.append(posts[pk])
+        if backwards:
+            return CursorPage(object_list, self, True, has_more)
+        return CursorPage(
+            object_list,
+            self,
+            has_more,
+            position is not None,
+        )
@@ -0,0 +1,35 @@
+import json
+
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+register = template.Library()
+
+MIME_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+@register.inclusion_tag('posts/includes/image.html')
+def post_image(post) -> dict:
+    try:
+        variants = json.loads(post.image_variants or '[]')
+    except ValueError:
+        variants = []
+    if not variants or not post.thumbnail:
+        return {'src': post.image.url if post.image else ''}
+    sources = {}
+    for variant in sorted(variants, key=lambda variant: variant['width']):
+        sources.setdefault(variant['format'], []).append(
+            f'{default_storage.url(variant["name"])} {variant["width"]}w',
+        )
+    fallback = max(variants, key=lambda variant: variant['width'])
+    return {
+        'src': post.thumbnail.url,
+        'width': fallback['width'],
+        'height': fallback['height'],
+        'sizes': settings.THUMBNAIL_SIZES,
+        'sources': [
+            {'type': MIME_TYPES[extension], 'srcset': ', '.join(srcset)}
+            for extension, srcset in sources.items()
+        ],
+    }
@@ -0,0 +1,126 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from posts import benchmark, dataset
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+RESULT = {
+    'requests': 100,
+    'errors': 0,
+    'throughput': 100.0,
+    'p50_ms': 10.0,
+    'p95_ms': 20.0,
+    'p99_ms': 40.0,
+    'queries': 5.0,
+}
+
+
+class FiguresTest(SimpleTestCase):
+    databases = {'default'}
+
+    def test_summarize(self):
+        samples = [(n / 1000, 3, n != 100) for n in range(1, 101)]
+        self.assertEqual(
+            benchmark.summarize(samples, 2),
+            {
+                'requests': 100,
+                'errors': 1,
+                'throughput': 50.0,
+                'p50_ms': 50.0,
+                'p95_ms': 95.0,
+                'p99_ms': 99.0,
+                'queries': 3.0,
+            },
+        )
+
+    def test_drift_within_tolerance_passes(self):
+        result = {
+            **RESULT,
+            'throughput': 80.0,
+            'p50_ms': 12.0,
+            'p95_ms': 24.0,
+            'p99_ms': 400.0,
+        }
+        self.assertEqual(
+            benchmark.compare({'index': result}, {'index': RESULT}, 0.25),
+            [],
+        )
+
+    def test_regressions_are_flagged(self):
+        result = {
+            **RESULT,
+            'throughput': 70.0,
+            'p95_ms': 30.0,
+            'queries': 6.0,
+        }
+        regressions = benchmark.compare(
+            {'index': result, 'profile': result},
+            {'index': RESULT},
+            0.25,
+        )
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(all(line.startswith('index:') for line in regressions))
+
+    def test_counted_reports_queries_in_header(self):
+        def application(environ, start_response):
+            list(User.objects.all())
+            start_response('200 OK', [])
+            return [b'']
+
+        headers = []
+        benchmark.counted(application)(
+            {},
+            lambda status, sent, exc_info=None: headers.extend(sent),
+        )
+        self.assertEqual(headers, [(benchmark.QUERIES_HEADER, '1')])
+
+    def test_isolated_run_keeps_the_live_cache(self):
+        cache.set('live', 'значение')
+        self.addCleanup(cache.delete, 'live')
+        with tempfile.TemporaryDirectory() as directory:
+            with benchmark.isolated(directory):
+                self.assertIsNone(cache.get('live'))
+                cache.set('benchmark', 'страница')
+                cache.clear()
+                self.assertFalse(settings.SQL_STATS)
+        self.assertEqual(cache.get('live'), 'значение')
+        self.assertIsNone(cache.get('benchmark'))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ScenarioTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        dataset.generate(
+            users=20,
+            posts=100,
+            comments=200,
+            follows=60,
+            groups=3,
+            timelines=True,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_every_scenario_runs_in_process(self):
+        results = benchmark.run(benchmark.SCENARIOS, 'inprocess', 1, 2, 1)
+        self.assertEqual(
+            list(results),
+            [scenario.name for scenario in benchmark.SCENARIOS],
+        )
+        for name, result in results.items():
+            with self.subTest(scenario=name):
+                self.assertEqual(result['requests'], 2)
+                self.assertEqual(result['errors'], 0)
+                self.assertGreater(result['queries'], 0)
@@ -0,0 +1,82 @@
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from posts import counters, dataset, search
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+SIZES = {
+    'users': 30,
+    'posts': 200,
+    'comments': 300,
+    'follows': 100,
+    'groups': 4,
+}
+
+
+def snapshot():
+    return [
+        list(model.objects.order_by('pk').values_list())
+        for model in (Group, Post, Comment, Follow)
+    ]
+
+
+class GenerateDatasetTest(TestCase):
+    def test_same_seed_gives_same_rows(self):
+        # Rolled back, sequences included, so both runs see the same database.
+        with transaction.atomic():
+            dataset.generate(**SIZES, seed=7)
+            first = snapshot()
+            transaction.set_rollback(True)
+        dataset.generate(**SIZES, seed=7)
+        self.assertEqual(snapshot(), first)
+        self.assertLessEqual(
+            Post.objects.latest('pub_date').pub_date,
+            dataset.EPOCH,
+        )
+
+    def test_ids_of_deleted_rows_are_not_reused(self):
+        deleted = mixer.blend(User).pk
+        User.objects.filter(pk=deleted).delete()
+        dataset.generate(**SIZES)
+        self.assertGreater(User.objects.order_by('pk').first().pk, deleted)
+
+    def test_rows_and_counters_are_consistent(self):
+        dataset.generate(**SIZES)
+        self.assertEqual(User.objects.count(), SIZES['users'])
+        self.assertEqual(Post.objects.count(), SIZES['posts'])
+        self.assertEqual(Comment.objects.count(), SIZES['comments'])
+        self.assertLessEqual(Follow.objects.count(), SIZES['follows'])
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertEqual(
+            counters.reconcile(),
+            {'users': 0, 'groups': 0, 'posts': 0},
+        )
+        post = Post.objects.first()
+        self.assertIn(
+            post.pk,
+            [pk for pk, _ in search.ranked(search.tokenize(post.text))],
+        )
+
+    def test_command_reports_progress(self):
+        out = StringIO()
+        call_command(
+            'generate_dataset',
+            *(f'--{name}={size}' for name, size in SIZES.items()),
+            '--until=2020-02-01',
+            stdout=out,
+        )
+        self.assertIn(f'posts: {SIZES["posts"]}', out.getvalue())
+        self.assertLessEqual(
+            Post.objects.latest('pub_date').pub_date,
+            datetime(2020, 2, 1, tzinfo=timezone.utc),
+        )
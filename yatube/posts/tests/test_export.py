@@ -0,0 +1,93 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+
+from django.contrib.admin import helpers
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from mixer.backend.django import mixer
+
+from posts.models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = mixer.blend(User, username='author')
+        cls.reader = mixer.blend(User, username='reader')
+        cls.group = mixer.blend('posts.Group')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            group=cls.group,
+            text='Пост',
+        )
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Да')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_full_dump_is_gzipped_json_lines_in_dependency_order(self):
+        path = os.path.join(self.directory, 'dump.jsonl.gz')
+        call_command('export', '--gzip', '-o', path)
+        with gzip.open(path, 'rt', encoding='utf-8') as dump:
+            records = [json.loads(line) for line in dump]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['group', 'post', 'comment', 'follow'],
+        )
+        self.assertEqual(records[1]['author'], 'author')
+        self.assertEqual(records[1]['group'], self.group.pk)
+        self.assertEqual(
+            records[3],
+            {
+                'type': 'follow',
+                'id': Follow.objects.get().pk,
+                'user': 'reader',
+                'author': 'author',
+            },
+        )
+
+    def test_json_lines_keep_microseconds(self):
+        path = os.path.join(self.directory, 'posts.jsonl')
+        call_command('export', 'posts', '-o', path)
+        with open(path, encoding='utf-8') as dump:
+            (record,) = [json.loads(line) for line in dump]
+        self.assertEqual(
+            parse_datetime(record['pub_date']),
+            Post.objects.get().pub_date,
+        )
+
+    def test_single_model_csv(self):
+        path = os.path.join(self.directory, 'posts.csv')
+        call_command('export', 'posts', '--format', 'csv', '-o', path)
+        with open(path, encoding='utf-8', newline='') as dump:
+            rows = list(csv.DictReader(dump))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['text'], 'Пост')
+
+    def test_admin_action_streams_selection(self):
+        admin = Client()
+        admin.force_login(
+            User.objects.create_superuser('admin', 'admin@example.com', 'x'),
+        )
+        response = admin.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'export_jsonl',
+                helpers.ACTION_CHECKBOX_NAME: [self.post.pk],
+            },
+        )
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['id'], self.post.pk)
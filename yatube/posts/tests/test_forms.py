@@ -1,5 +1,7 @@
+import json
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -7,6 +9,7 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from mixer.backend.django import mixer
 
+from posts import thumbnails
 from posts.models import Comment, Group, Post
 from posts.tests.common import image
 
@@ -54,6 +57,73 @@ class PostFormTests(TestCase):
         self.assertEqual(post.group, group)
         self.assertEqual(post.image.name, 'posts/small.gif')
 
+    def test_saving_image_schedules_thumbnail(self):
+        with mock.patch('posts.forms.thumbnails.schedule') as schedule:
+            self.auth.post(
+                reverse('posts:post_create'),
+                data={'text': 'Текст поста', 'image': image()},
+            )
+        schedule.assert_called_once_with(Post.objects.get())
+
+    def test_image_variants_are_generated_and_rendered(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Текст',
+            image=image(),
+        )
+        thumbnails.generate(post.id)
+        post.refresh_from_db()
+        variants = json.loads(post.image_variants)
+        self.assertEqual(
+            {(variant['width'], variant['format']) for variant in variants},
+            {
+                (width, extension)
+                for width in settings.THUMBNAIL_WIDTHS
+                for extension in thumbnails.FORMATS
+            },
+        )
+        self.assertTrue(post.thumbnail.name.endswith('-960.jpeg'))
+        response = self.anon.get(reverse('posts:post_detail', args=(post.id,)))
+        self.assertContains(response, f'src="{post.thumbnail.url}"')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '-320.webp 320w')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_too_large_upload_is_rejected(self):
+        response = self.auth.post(
+            reverse('posts:post_create'),
+            data={'text': 'Текст поста', 'image': image()},
+        )
+        self.assertFormError(
+            response,
+            'form',
+            'image',
+            'Файл больше 0 МБ.',
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=2_000)
+    def test_too_many_pixels_are_rejected(self):
+        response = self.auth.post(
+            reverse('posts:post_create'),
+            data={'text': 'Текст поста', 'image': image()},
+        )
+        self.assertEqual(
+            response.context['form'].errors['image'][0],
+            'Картинка больше 0 мегапикселей.',
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_SIZE=(20, 20))
+    def test_large_image_is_downscaled_on_save(self):
+        with mock.patch('posts.forms.thumbnails.schedule'):
+            self.auth.post(
+                reverse('posts:post_create'),
+                data={'text': 'Текст поста', 'image': image()},
+            )
+        post = Post.objects.get()
+        self.assertEqual((post.image.width, post.image.height), (20, 20))
+
     def test_anon_cant_create_post(self):
         self.anon.post(
             reverse('posts:post_create'),
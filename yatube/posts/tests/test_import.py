@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from posts import importer
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class ImportTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'dump.jsonl.gz')
+        author = mixer.blend(User, username='author')
+        reader = mixer.blend(User, username='reader')
+        group = mixer.blend('posts.Group')
+        self.posts = [
+            Post.objects.create(author=author, group=group, text=f'Пост {n}')
+            for n in range(3)
+        ]
+        # The dump keeps milliseconds, as DjangoJSONEncoder writes them.
+        self.pub_date = (timezone.now() - timedelta(days=30)).replace(
+            microsecond=0,
+        )
+        Post.objects.update(pub_date=self.pub_date)
+        Comment.objects.create(post=self.posts[0], author=reader, text='Да')
+        Follow.objects.create(user=reader, author=author)
+        call_command('export', '--gzip', '-o', self.path)
+        for model in (Follow, Comment, Post, Group, User):
+            model.objects.all().delete()
+
+    def load(self, *args):
+        call_command('import_dump', self.path, *args, stdout=StringIO())
+
+    def test_dump_is_loaded_with_dates_and_derived_data(self):
+        self.load('--chunk-size', '2')
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            set(Post.objects.values_list('pub_date', flat=True)),
+            {self.pub_date},
+        )
+        author = User.objects.get(username='author')
+        self.assertFalse(author.has_usable_password())
+        self.assertEqual(UserStats.objects.get(user=author).posts_count, 3)
+        self.assertEqual(
+            Post.objects.get(pk=self.posts[0].pk).comments_count,
+            1,
+        )
+        self.assertFalse(os.path.exists(importer.checkpoint_path(self.path)))
+
+    def test_rerun_is_idempotent(self):
+        self.load()
+        self.load()
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_crashed_import_resumes_from_checkpoint(self):
+        load_chunk = importer._load_chunk
+        calls = []
+
+        def crash_on_third_chunk(lines, offset):
+            calls.append(offset)
+            if len(calls) == 3:
+                raise RuntimeError('сбой')
+            return load_chunk(lines, offset)
+
+        with mock.patch.object(
+            importer,
+            '_load_chunk',
+            crash_on_third_chunk,
+        ):
+            with self.assertRaises(RuntimeError):
+                self.load('--chunk-size', '1', '--no-rebuild')
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertTrue(os.path.exists(importer.checkpoint_path(self.path)))
+        with mock.patch.object(
+            importer,
+            '_load_chunk',
+            wraps=load_chunk,
+        ) as resumed:
+            self.load('--chunk-size', '1')
+        # Two of the six lines were committed before the crash.
+        self.assertEqual(resumed.call_count, 4)
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_empty_dump_is_loaded(self):
+        open(self.path, 'wb').close()
+        self.assertEqual(importer.load(self.path), Counter())
+        self.assertFalse(os.path.exists(importer.checkpoint_path(self.path)))
+
+
+class BrokenDumpTest(TransactionTestCase):
+    def test_dangling_reference_is_a_dump_error(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as dump:
+            dump.write(
+                json.dumps(
+                    {
+                        'type': 'comment',
+                        'id': 1,
+                        'post': 404,
+                        'author': 'reader',
+                        'text': 'Комментарий без поста',
+                        'created': '2020-01-01T00:00:00Z',
+                    },
+                ),
+            )
+            dump.flush()
+            with self.assertRaises(importer.DumpError) as raised:
+                importer.load(dump.name)
+        self.assertIsInstance(raised.exception.__cause__, IntegrityError)
+        self.assertFalse(Comment.objects.exists())
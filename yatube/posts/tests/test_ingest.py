@@ -0,0 +1,141 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from mixer.backend.django import mixer
+
+from posts import search
+from posts.ingest import ingest
+from posts.models import Comment, Follow, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+def lines(*records):
+    return [json.dumps(record, ensure_ascii=False) for record in records]
+
+
+class IngestTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = mixer.blend(User, username='author')
+        cls.reader = mixer.blend(User, username='reader')
+        cls.group = mixer.blend('posts.Group', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_posts_and_derived_data_are_created(self):
+        report = ingest(
+            lines(
+                {'type': 'post', 'author': 'author', 'text': 'Первый кот'},
+                {
+                    'type': 'post',
+                    'author': 'author',
+                    'text': 'Второй',
+                    'group': 'group',
+                },
+            ),
+            chunk_size=1,
+        )
+        self.assertEqual(report, {'posts': 2, 'comments': 0, 'errors': []})
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count,
+            2,
+        )
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(),
+            2,
+        )
+        self.assertEqual(
+            [pk for pk, _ in search.ranked(search.tokenize('кот'))],
+            [Post.objects.get(text='Первый кот').pk],
+        )
+
+    def test_comments_update_post_counters(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        report = ingest(
+            lines(
+                *(
+                    {
+                        'type': 'comment',
+                        'author': 'reader',
+                        'post': post.pk,
+                        'text': f'Комментарий {number}',
+                    }
+                    for number in range(3)
+                ),
+            ),
+        )
+        self.assertEqual(report['comments'], 3)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 3)
+        self.assertEqual(Comment.objects.count(), 3)
+
+    def test_bad_lines_are_reported_and_skipped(self):
+        report = ingest(
+            [
+                'не json',
+                json.dumps({'type': 'post', 'author': 'nobody', 'text': 'x'}),
+                json.dumps({'type': 'post', 'author': 'author', 'text': ''}),
+                json.dumps({'type': 'comment', 'author': 'author', 'post': 0}),
+                json.dumps({'type': 'post', 'author': 'author', 'text': 'ok'}),
+            ],
+        )
+        self.assertEqual(report['posts'], 1)
+        self.assertEqual(
+            [error['line'] for error in report['errors']],
+            [1, 2, 3, 4],
+        )
+
+    def test_non_staff_uploader_posts_only_as_self(self):
+        report = ingest(
+            lines(
+                {'type': 'post', 'text': 'Свой пост'},
+                {'type': 'post', 'author': 'author', 'text': 'Чужой пост'},
+            ),
+            user=self.reader,
+        )
+        self.assertEqual(report['posts'], 1)
+        self.assertEqual(Post.objects.get().author, self.reader)
+
+    def test_command_reads_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as file:
+            file.write(
+                '\n'.join(
+                    lines(
+                        {'type': 'post', 'author': 'author', 'text': 'Пост'},
+                    ),
+                ),
+            )
+            file.flush()
+            call_command('ingest', file.name, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_keys_come_from_the_database(self):
+        deleted = Post.objects.create(author=self.author, text='Удалён').pk
+        Post.objects.filter(pk=deleted).delete()
+        report = ingest(
+            lines(
+                *(
+                    {'type': 'post', 'author': 'author', 'text': f'Пост {n}'}
+                    for n in range(300)
+                ),
+            ),
+        )
+        self.assertEqual(report['posts'], 300)
+        ids = set(Post.objects.values_list('pk', flat=True))
+        self.assertGreater(min(ids), deleted)
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(user=self.reader).values_list(
+                    'post_id',
+                    flat=True,
+                ),
+            ),
+            ids,
+        )
@@ -1,9 +1,23 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 from mixer.backend.django import mixer
 
 from core.utils import truncatechars
-from posts.models import MAX_LEN_TEXT, MAX_LEN_TITLE, Post
+from posts import counters
+from posts.models import (
+    MAX_LEN_TEXT,
+    MAX_LEN_TITLE,
+    Comment,
+    Follow,
+    Group,
+    Post,
+    UserStats,
+)
+from posts.query_plans import feed_queries, without_feed_indexes
 
 User = get_user_model()
 
@@ -76,3 +90,98 @@ class GroupModelTest(TestCase):
             truncatechars(test_group.title, MAX_LEN_TITLE),
             str(test_group),
         )
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = mixer.blend(User)
+        self.reader = mixer.blend(User)
+        self.group = mixer.blend('posts.Group')
+
+    def test_post_and_comment_counters(self):
+        post = Post.objects.create(
+            text='Текст',
+            author=self.author,
+            group=self.group,
+        )
+        Comment.objects.create(text='Текст', author=self.reader, post=post)
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count,
+            1,
+        )
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count,
+            0,
+        )
+
+    def test_group_change_moves_counter(self):
+        post = Post.objects.create(
+            text='Текст',
+            author=self.author,
+            group=self.group,
+        )
+        other = mixer.blend('posts.Group')
+        post = Post.objects.get(pk=post.pk)
+        post.group = other
+        post.save()
+        self.assertEqual(
+            list(
+                Group.objects.filter(
+                    pk__in=(self.group.pk, other.pk),
+                ).values_list('pk', 'posts_count'),
+            ),
+            [(self.group.pk, 0), (other.pk, 1)],
+        )
+
+    def test_follow_counters(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count,
+            1,
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count,
+            1,
+        )
+
+    def test_reconcile_fixes_drift(self):
+        mixer.cycle(3).blend('posts.Post', author=self.author)
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        self.assertEqual(counters.reconcile()['users'], 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count,
+            3,
+        )
+
+
+class FeedIndexesTest(TestCase):
+    def test_feed_queries_read_index_ranges(self):
+        post = mixer.blend('posts.Post')
+        for name, queryset in feed_queries(post, mixer.blend(User)).items():
+            with self.subTest(name=name):
+                plan = queryset.explain()
+                self.assertNotIn('TEMP B-TREE', plan)
+                self.assertNotRegex(plan, r'(?m)SCAN \S+$')
+
+    def test_plans_without_indexes_are_rolled_back(self):
+        def indexes():
+            with connection.cursor() as cursor:
+                return connection.introspection.get_constraints(
+                    cursor,
+                    Post._meta.db_table,
+                )
+
+        with without_feed_indexes():
+            self.assertNotIn('post_pub_date', indexes())
+        self.assertIn('post_pub_date', indexes())
+        mixer.blend('posts.Post', group=mixer.blend('posts.Group'))
+        out = StringIO()
+        call_command('explain_feeds', '--without-indexes', stdout=out)
+        self.assertIn('group_list', out.getvalue())
@@ -1,6 +1,7 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 from mixer.backend.django import mixer
@@ -42,6 +43,9 @@ class PostUrlTest(TestCase):
             ),
         }
 
+    def setUp(self) -> None:
+        cache.clear()
+
     def test_http_statuses(self) -> None:
         httpstatuses = (
             (self.urls.get('index'), HTTPStatus.OK, self.anon),
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django import forms
 from django.conf import settings
@@ -9,7 +10,9 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from mixer.backend.django import mixer
 
-from posts.models import Comment, Follow, Post
+from jobs.models import Job
+from posts import timeline
+from posts.models import Comment, Follow, Post, TimelineEntry
 from posts.tests.common import image
 
 User = get_user_model()
@@ -82,6 +85,9 @@ class PostPagesTests(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self):
+        cache.clear()
+
     def test_pages_uses_correct_template(self):
         templates_pages_names = {
             reverse(self.index_url[0]): self.index_url[1],
@@ -211,6 +217,24 @@ class PostPagesTests(TestCase):
         response = self.auth.get(reverse(self.index_url[0]))
         self.assertEqual(response.content, cached_response)
 
+    def test_index_cache_is_invalidated_by_new_post(self):
+        cache.clear()
+        self.anon.get(reverse(self.index_url[0]))
+        post = mixer.blend('posts.Post', text='Свежий пост')
+        response = self.anon.get(reverse(self.index_url[0]))
+        self.assertContains(response, post.text)
+
+    def test_index_cache_is_invalidated_by_new_comment(self):
+        cache.clear()
+        url = reverse(self.index_url[0])
+        self.auth.get(url)
+        Comment.objects.create(
+            text='Комментарий',
+            author=self.user,
+            post=self.post,
+        )
+        self.assertContains(self.auth.get(url), 'Комментариев: 2')
+
 
 class PaginatorViewsTest(TestCase):
     TEST_NUMBER_OF_POSTS = 15
@@ -229,6 +253,9 @@ class PaginatorViewsTest(TestCase):
                 group=cls.group,
             )
 
+    def setUp(self):
+        cache.clear()
+
     def test_paginator_on_pages(self):
         posts_on_first_page = settings.NUMBER_OF_POSTS
         posts_on_second_page = 15 - settings.NUMBER_OF_POSTS
@@ -252,6 +279,85 @@ class PaginatorViewsTest(TestCase):
                     posts_on_second_page,
                 )
 
+    def test_cursor_pages_walk_whole_feed(self):
+        url_pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        ]
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        for page in url_pages:
+            with self.subTest(page=page):
+                first = self.anon.get(page).context['page_obj']
+                second = self.anon.get(
+                    f'{page}?cursor={first.next_cursor}',
+                ).context['page_obj']
+                self.assertEqual(list(first) + list(second), expected)
+                self.assertFalse(second.has_next())
+                previous = self.anon.get(
+                    f'{page}?cursor={second.previous_cursor}',
+                ).context['page_obj']
+                self.assertEqual(list(previous), list(first))
+                self.assertFalse(previous.has_previous())
+
+    def test_index_cache_is_kept_per_page(self):
+        cache.clear()
+        url = reverse('posts:index')
+        self.assertNotContains(self.anon.get(url), 'Пост 0')
+        self.assertContains(self.anon.get(url + '?page=2'), 'Пост 0')
+
+    def test_cached_index_page_is_not_read_again(self):
+        auth = Client()
+        auth.force_login(self.user)
+        url = reverse('posts:index')
+        auth.get(url)
+        # Only the session and the user; junk in the query string names
+        # the same first page.
+        for query in ('', '?page=1', '?page=junk'):
+            with self.subTest(query=query), self.assertNumQueries(2):
+                auth.get(url + query)
+
+    def test_cursor_and_deep_pages_are_not_cached(self):
+        auth = Client()
+        auth.force_login(self.user)
+        url = reverse('posts:index')
+        with override_settings(FEED_CACHE_PAGES=1):
+            for query in ('?page=2', '?cursor=junk'):
+                auth.get(url + query)
+                with self.subTest(query=query), self.assertNumQueries(3):
+                    auth.get(url + query)
+
+    @override_settings(FEED_CACHE_PAGES=1)
+    def test_deep_page_number_redirects_to_cursor(self):
+        url_pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        ]
+        per_page = settings.NUMBER_OF_POSTS
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        for page in url_pages:
+            with self.subTest(page=page):
+                response = self.anon.get(page, {'page': 2})
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+                self.assertIn('cursor=', response['Location'])
+                cursor_page = self.anon.get(response['Location'])
+                self.assertEqual(
+                    list(cursor_page.context['page_obj']),
+                    expected[per_page:],
+                )
+                self.assertEqual(
+                    self.anon.get(page, {'page': 3}).status_code,
+                    HTTPStatus.NOT_FOUND,
+                )
+
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.anon.get(reverse('posts:index') + '?cursor=broken')
+        self.assertEqual(
+            len(response.context['page_obj']),
+            settings.NUMBER_OF_POSTS,
+        )
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -309,3 +415,374 @@ class FollowViewsTest(TestCase):
         self.assertFalse(
             response.context['page_obj'],
         )
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = mixer.blend('posts.Post', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower,
+                post=post,
+            ).exists(),
+        )
+
+    def test_unfollow_trims_timeline(self):
+        follow = Follow.objects.create(user=self.follower, author=self.author)
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.follower))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_read_on_demand(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = mixer.blend('posts.Post', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.follower))
+        response = self.auth.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, NUMBER_OF_POSTS=2)
+    def test_feed_merges_timeline_and_popular_authors(self):
+        popular = mixer.blend(User)
+        Follow.objects.create(user=mixer.blend(User), author=popular)
+        Follow.objects.create(user=self.follower, author=popular)
+        Follow.objects.create(user=self.follower, author=self.author)
+        for number in range(3):
+            mixer.blend('posts.Post', author=self.author)
+            mixer.blend('posts.Post', author=popular)
+        expected = list(
+            Post.objects.filter(
+                author__in=(self.author, popular),
+            ).order_by('-pub_date', '-id'),
+        )
+        url = reverse('posts:follow_index')
+        seen = []
+        page = self.auth.get(url).context['page_obj']
+        while True:
+            seen.extend(page)
+            if not page.has_next():
+                break
+            page = self.auth.get(
+                url,
+                {'cursor': page.next_cursor},
+            ).context['page_obj']
+        self.assertEqual(seen, expected)
+        self.assertEqual(
+            list(self.auth.get(url, {'page': 2}).context['page_obj']),
+            expected[2:4],
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_FANOUT_MARGIN=1)
+    def test_posts_of_author_who_lost_popularity_stay_in_feed(self):
+        other = Follow.objects.create(
+            user=mixer.blend(User),
+            author=self.author,
+        )
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = mixer.blend('posts.Post', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        other.delete()
+        url = reverse('posts:follow_index')
+        self.assertIn(post, self.auth.get(url).context['page_obj'])
+        self.assertTrue(
+            Job.objects.filter(
+                key=f'timelines:fan-out:{self.author.pk}',
+            ).exists(),
+        )
+        timeline.fan_out_author(self.author.pk)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.follower, post=post),
+        )
+        with override_settings(TIMELINE_FANOUT_MARGIN=0):
+            self.assertIn(post, self.auth.get(url).context['page_obj'])
+
+    @override_settings(TIMELINE_LENGTH=3, NUMBER_OF_POSTS=2)
+    def test_feed_reads_past_the_shortened_timeline(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        mixer.cycle(6).blend('posts.Post', author=self.author)
+        timeline.shorten_followers(self.author.pk)
+        expected = list(
+            Post.objects.filter(author=self.author).order_by(
+                '-pub_date',
+                '-id',
+            ),
+        )
+        url = reverse('posts:follow_index')
+        pages = [self.auth.get(url).context['page_obj']]
+        while pages[-1].has_next():
+            pages.append(
+                self.auth.get(
+                    url,
+                    {'cursor': pages[-1].next_cursor},
+                ).context['page_obj'],
+            )
+        self.assertEqual([post for page in pages for post in page], expected)
+        previous = self.auth.get(
+            url,
+            {'cursor': pages[-1].previous_cursor},
+        ).context['page_obj']
+        self.assertEqual(list(previous), list(pages[-2]))
+        self.assertEqual(
+            list(self.auth.get(url, {'page': 3}).context['page_obj']),
+            expected[4:6],
+        )
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_fan_out_keeps_timelines_short(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = mixer.cycle(3).blend('posts.Post', author=self.author)
+        self.assertTrue(
+            Job.objects.filter(
+                name=timeline.shorten_followers.job_name,
+                args=f'[{self.author.pk}]',
+            ).exists(),
+        )
+        timeline.shorten_followers(self.author.pk)
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(
+                    user=self.follower,
+                ).values_list('post', flat=True),
+            ),
+            {posts[1].pk, posts[2].pk},
+        )
+
+    @override_settings(TIMELINE_LENGTH=2, TIMELINE_FANOUT_LIMIT=2)
+    def test_rebuild_keeps_newest_posts_of_fanned_out_authors(self):
+        author, popular = mixer.cycle(2).blend(User)
+        Follow.objects.create(user=self.follower, author=author)
+        Follow.objects.create(user=self.follower, author=popular)
+        Follow.objects.create(user=mixer.blend(User), author=popular)
+        posts = mixer.cycle(3).blend('posts.Post', author=author)
+        mixer.blend('posts.Post', author=popular)
+        TimelineEntry.objects.all().delete()
+        timeline.rebuild()
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(
+                    user=self.follower,
+                ).values_list('post', flat=True),
+            ),
+            {posts[1].pk, posts[2].pk},
+        )
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = mixer.blend(User, username='author')
+        cls.reader = mixer.blend(User, username='reader')
+        cls.group = mixer.blend('posts.Group', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for post in range(settings.NUMBER_OF_POSTS):
+            mixer.blend(
+                'posts.Post',
+                author=cls.author if post % 2 else mixer.blend(User),
+                group=cls.group if post % 3 else mixer.blend('posts.Group'),
+                image='',
+            )
+        cls.anon = Client()
+        cls.auth = Client()
+        cls.auth.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_pages_have_fixed_query_count(self):
+        pages = (
+            (self.anon, reverse('posts:index'), 1),
+            (self.anon, reverse('posts:group_list', args=('group',)), 2),
+            (self.anon, reverse('posts:profile', args=('author',)), 2),
+            (self.auth, reverse('posts:follow_index'), 4),
+        )
+        for client, url, queries in pages:
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                client.get(url)
+
+
+@override_settings(NUMBER_OF_COMMENTS=2)
+class CommentsViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = mixer.blend('posts.Post', image='')
+        cls.comments = [
+            Comment.objects.create(
+                text=f'Комментарий {number}',
+                author=mixer.blend(User),
+                post=cls.post,
+            )
+            for number in range(5)
+        ]
+        cls.anon = Client()
+
+    def test_post_detail_shows_first_comments_page(self):
+        response = self.anon.get(
+            reverse('posts:post_detail', args=(self.post.id,)),
+        )
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[:-3:-1],
+        )
+
+    def test_comments_endpoint_walks_all_comments(self):
+        url = reverse('posts:post_comments', args=(self.post.id,))
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = self.anon.get(
+                url,
+                {'cursor': cursor, 'format': 'json'},
+            ).json()
+            seen.extend(comment['id'] for comment in response['results'])
+            cursor = response['next']
+        self.assertEqual(
+            seen,
+            [comment.id for comment in reversed(self.comments)],
+        )
+
+    def test_comments_fragment_has_authors_joined(self):
+        url = reverse('posts:post_comments', args=(self.post.id,))
+        with self.assertNumQueries(2):
+            response = self.anon.get(url)
+        self.assertTemplateUsed(response, 'includes/comments_page.html')
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = mixer.blend(User)
+        cls.posts = [
+            Post.objects.create(author=author, text=text)
+            for text in (
+                'Кот спит на диване',
+                'Кот, кот и ещё раз кот',
+                'Собака гуляет',
+                'Про котов ни слова',
+            )
+        ]
+        Comment.objects.create(
+            author=author,
+            post=cls.posts[2],
+            text='А где же кот?',
+        )
+        cls.anon = Client()
+
+    def search(self, query, **params):
+        return self.anon.get(reverse('posts:search'), {'q': query, **params})
+
+    def test_search_ranks_posts_and_comments(self):
+        found = list(self.search('кот').context['page_obj'])
+        self.assertEqual(found[0], self.posts[1])
+        self.assertEqual(
+            set(found),
+            {self.posts[0], self.posts[1], self.posts[2]},
+        )
+
+    def test_all_words_must_match(self):
+        found = list(self.search('кот диване').context['page_obj'])
+        self.assertEqual(found, [self.posts[0]])
+
+    @override_settings(NUMBER_OF_POSTS=1)
+    def test_cursor_pages_walk_all_results(self):
+        seen = []
+        page = self.search('кот').context['page_obj']
+        seen.extend(page)
+        while page.has_next():
+            page = self.search('кот', cursor=page.next_cursor).context[
+                'page_obj'
+            ]
+            seen.extend(page)
+        self.assertEqual(seen[0], self.posts[1])
+        self.assertEqual(
+            set(seen),
+            {self.posts[0], self.posts[1], self.posts[2]},
+        )
+        self.assertEqual(len(seen), 3)
+
+    def test_edited_and_deleted_posts_leave_the_index(self):
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Теперь про собак'
+        post.save()
+        Post.objects.filter(pk=self.posts[1].pk).delete()
+        found = list(self.search('кот').context['page_obj'])
+        self.assertEqual(found, [self.posts[2]])
+
+    def test_admin_search_uses_index(self):
+        admin = Client()
+        admin.force_login(
+            User.objects.create_superuser('admin', 'admin@example.com', 'x'),
+        )
+        response = admin.get(
+            reverse('admin:posts_post_changelist'),
+            {'q': 'собака'},
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list),
+            [self.posts[2]],
+        )
+
+
+@override_settings(SEARCH_FTS=False)
+class FallbackSearchViewsTest(SearchViewsTest):
+    pass
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = mixer.blend(
+            'posts.Post',
+            image='',
+            group=mixer.blend('posts.Group'),
+        )
+        cls.anon = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_pages_answer_not_modified(self):
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.post.group.slug,)),
+            reverse('posts:profile', args=(self.post.author.username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+        ):
+            with self.subTest(url=url):
+                etag = self.anon.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.anon.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_new_comment_changes_etag(self):
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        etag = self.anon.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post,
+            author=self.post.author,
+            text='Новый комментарий',
+        )
+        response = self.anon.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_differs_between_readers(self):
+        url = reverse('posts:index')
+        reader = Client()
+        reader.force_login(mixer.blend(User))
+        self.assertNotEqual(
+            self.anon.get(url)['ETag'],
+            reader.get(url)['ETag'],
+        )
+
+    def test_new_csrf_cookie_changes_etag(self):
+        reader = Client()
+        reader.force_login(mixer.blend(User))
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        reader.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+        etag = reader.get(url)['ETag']
+        # Logging in again rotates the token the cached form was built with.
+        reader.cookies[settings.CSRF_COOKIE_NAME] = 'b' * 64
+        response = reader.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,83 @@
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from core.cache import FEED_VERSION, bump_version
+from jobs.queue import enqueue, job
+from posts.models import Post
+
+THUMBNAIL_SIZE = (960, 339)
+THUMBNAIL_DIR = 'posts/thumbnails/'
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'optimize': True},
+}
+FALLBACK_FORMAT = 'jpeg'
+
+
+def schedule(post: Post) -> None:
+    enqueue(generate, [post.pk], key=f'thumbnails:{post.pk}')
+
+
+def render(image):
+    """Decodes the original once and yields every variant of it.
+
+    The crop is made at the largest width and each narrower width is
+    downscaled from the previous one, so the costly work is done once.
+    """
+    width, height = THUMBNAIL_SIZE
+    with Image.open(image) as source:
+        frame = ImageOps.fit(
+            ImageOps.exif_transpose(source).convert('RGB'),
+            THUMBNAIL_SIZE,
+            Image.LANCZOS,
+        )
+    for variant_width in sorted(settings.THUMBNAIL_WIDTHS, reverse=True):
+        size = (variant_width, round(height * variant_width / width))
+        if frame.size != size:
+            frame = frame.resize(size, Image.LANCZOS)
+        for extension, options in FORMATS.items():
+            buffer = BytesIO()
+            frame.save(buffer, **options)
+            yield size, extension, ContentFile(buffer.getvalue())
+
+
+@job(priority=10)
+def generate(post_id: int) -> None:
+    post = Post.objects.only('image').get(pk=post_id)
+    thumbnail = ''
+    variants = []
+    if post.image:
+        name, _ = os.path.splitext(os.path.basename(post.image.name))
+        with post.image.open('rb') as image:
+            for (width, height), extension, content in render(image):
+                path = default_storage.save(
+                    f'{THUMBNAIL_DIR}{name}-{width}.{extension}',
+                    content,
+                )
+                variants.append(
+                    {
+                        'name': path,
+                        'width': width,
+                        'height': height,
+                        'format': extension,
+                    },
+                )
+        thumbnail = max(
+            (
+                variant
+                for variant in variants
+                if variant['format'] == FALLBACK_FORMAT
+            ),
+            key=lambda variant: variant['width'],
+        )['name']
+    Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnail=thumbnail,
+        image_variants=json.dumps(variants) if variants else '',
+    )
+    bump_version(FEED_VERSION)
@@ -0,0 +1,301 @@
+import heapq
+from collections import defaultdict
+from itertools import groupby, islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection
+
+from core.utils import KeysetPaginator
+from jobs.queue import enqueue, job
+from posts.models import FEED_FIELDS, Follow, Post, TimelineEntry, UserStats
+
+ENTRY_KEYS = ('pub_date', 'post_id')
+
+
+def is_popular(author_id: int) -> bool:
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def popular_authors(user):
+    """Followed authors whose posts are read rather than fanned out; the
+    margin keeps an author here until ``fan_out_author`` has copied the
+    posts nobody fanned out while they were over the limit.
+    """
+    return Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+        - settings.TIMELINE_FANOUT_MARGIN,
+    ).values('author')
+
+
+def fan_out(post: Post) -> None:
+    fan_out_many([post])
+
+
+def fan_out_many(posts) -> None:
+    """Copies new posts into their followers' timelines in one pass."""
+    by_author = defaultdict(list)
+    for post in posts:
+        by_author[post.author_id].append(post)
+    popular = UserStats.objects.filter(
+        user_id__in=by_author,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True)
+    fanned = by_author.keys() - set(popular)
+    follows = Follow.objects.filter(author_id__in=fanned).values_list(
+        'user_id',
+        'author_id',
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id, author_id in follows.iterator()
+            for post in by_author[author_id]
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    for author_id in sorted(fanned):
+        enqueue(
+            shorten_followers,
+            [author_id],
+            key=f'timelines:shorten:{author_id}',
+        )
+
+
+def backfill(follow: Follow) -> None:
+    _copy_posts(follow)
+    shorten([follow.user_id])
+
+
+def _copy_posts(follow):
+    if is_popular(follow.author_id):
+        return
+    posts = Post.objects.filter(author_id=follow.author_id).values_list(
+        'pk',
+        'pub_date',
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=follow.user_id,
+                post_id=pk,
+                author_id=follow.author_id,
+                pub_date=pub_date,
+            )
+            for pk, pub_date in posts[: settings.TIMELINE_LENGTH]
+        ),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def trim(follow: Follow) -> None:
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id,
+        author_id=follow.author_id,
+    ).delete()
+    # The counter is already down (see posts.signals): an author who has
+    # just dropped below the limit has posts that were never fanned out.
+    if UserStats.objects.filter(
+        user_id=follow.author_id,
+        followers_count=settings.TIMELINE_FANOUT_LIMIT - 1,
+    ).exists():
+        enqueue(
+            fan_out_author,
+            [follow.author_id],
+            key=f'timelines:fan-out:{follow.author_id}',
+        )
+
+
+def _insert_entries(select, params) -> None:
+    """Adds the ``(user, post, author, pub_date)`` rows of ``select`` to
+    the timelines in one statement, skipping those already there.
+    """
+    ops = connection.ops
+    columns = ', '.join(
+        ops.quote_name(TimelineEntry._meta.get_field(field).column)
+        for field in ('user', 'post', 'author', 'pub_date')
+    )
+    insert = ops.insert_statement(ignore_conflicts=True)
+    suffix = ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+    table = ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{insert} {table} ({columns}) {select}{suffix}',
+            params,
+        )
+
+
+@job()
+def fan_out_author(author_id: int) -> None:
+    """Copies the newest posts of an author who is no longer popular into
+    the followers' timelines.
+    """
+    _insert_entries(
+        f"""
+        SELECT follow.user_id, post.id, post.author_id, post.pub_date
+        FROM {Follow._meta.db_table} follow
+        JOIN (
+            SELECT id, author_id, pub_date FROM {Post._meta.db_table}
+            WHERE author_id = %s
+            ORDER BY pub_date DESC, id DESC
+            LIMIT %s
+        ) post ON post.author_id = follow.author_id
+        WHERE follow.author_id = %s
+        """,
+        [author_id, settings.TIMELINE_LENGTH, author_id],
+    )
+    shorten_followers(author_id)
+
+
+def shorten(user_ids) -> None:
+    """Keeps only the newest ``TIMELINE_LENGTH`` entries of each timeline."""
+    keep = settings.TIMELINE_LENGTH
+    for user_id in user_ids:
+        older = (
+            TimelineEntry.objects.filter(user_id=user_id)
+            .order_by('-pub_date', '-post_id')
+            .values('pk')[keep:]
+        )
+        TimelineEntry.objects.filter(pk__in=older).delete()
+
+
+@job()
+def shorten_followers(author_id: int) -> None:
+    shorten(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+        .iterator(),
+    )
+
+
+def feed(user):
+    """Every post of ``user``'s feed, for counting; pages are read by
+    ``FeedPaginator``.
+    """
+    return Post.objects.filter(
+        author__in=Follow.objects.filter(user=user).values('author'),
+    )
+
+
+class FeedPaginator(KeysetPaginator):
+    """Keyset pages of a reader's feed.
+
+    The timeline is read as a range of its ``(user, pub_date, post)``
+    index; posts of the few popular authors the reader follows, which are
+    never fanned out, come from a second ordered query and are merged in.
+    The timeline keeps only the newest ``TIMELINE_LENGTH`` posts, so
+    pages past its end read older posts of the followed authors directly.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(feed(user).for_feed(), per_page)
+        self.user = user
+
+    def keys_at(self, offset, limit) -> list:
+        return [
+            [getattr(post, key) for key in self.keys]
+            for post in self.rows(None, False, limit, offset)
+        ]
+
+    def rows(self, position, backwards, limit, offset=0) -> list:
+        wanted = offset + limit
+        entries = KeysetPaginator(
+            TimelineEntry.objects.filter(user=self.user)
+            .select_related('post__author', 'post__group')
+            .only(
+                'pub_date',
+                'post',
+                *(f'post__{field}' for field in FEED_FIELDS),
+            ),
+            limit,
+            ENTRY_KEYS,
+        ).rows(position, backwards, wanted)
+        streams = [[entry.post for entry in entries]]
+        popular = list(
+            popular_authors(self.user).values_list('author', flat=True),
+        )
+        if popular:
+            streams.append(
+                KeysetPaginator(
+                    Post.objects.for_feed().filter(author__in=popular),
+                    limit,
+                ).rows(position, backwards, wanted),
+            )
+        # Read from the top, a timeline shorter than TIMELINE_LENGTH is
+        # a whole one: nothing was trimmed off its end.
+        short = len(entries) < wanted
+        if (position is not None and (backwards or short)) or (
+            short and len(entries) >= settings.TIMELINE_LENGTH
+        ):
+            streams.append(
+                KeysetPaginator(self._past_timeline(popular), limit).rows(
+                    position,
+                    backwards,
+                    wanted,
+                ),
+            )
+        merged = heapq.merge(
+            *streams,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not backwards,
+        )
+        # A post fanned out before its author became popular is in both.
+        unique = (post for _, (post, *_) in groupby(merged, attrgetter('pk')))
+        return list(islice(unique, offset, wanted))
+
+    def _past_timeline(self, popular):
+        """Posts of the followed authors older than the oldest timeline
+        entry, which ``shorten`` has dropped.
+        """
+        posts = self.queryset.exclude(author__in=popular)
+        oldest = (
+            TimelineEntry.objects.filter(user=self.user)
+            .order_by(*ENTRY_KEYS)
+            .values_list(*ENTRY_KEYS)
+            .first()
+        )
+        if oldest is None:
+            return posts
+        return posts.filter(self._seek(oldest, backwards=False))
+
+
+def rebuild() -> None:
+    """Refills every timeline in one statement with the newest
+    ``TIMELINE_LENGTH`` posts of the authors it follows.
+    """
+    TimelineEntry.objects.all().delete()
+    _insert_entries(
+        f"""
+        SELECT user_id, post_id, author_id, pub_date FROM (
+            SELECT
+                follow.user_id,
+                post.id AS post_id,
+                post.author_id,
+                post.pub_date,
+                ROW_NUMBER() OVER (
+                    PARTITION BY follow.user_id
+                    ORDER BY post.pub_date DESC, post.id DESC
+                ) AS place
+            FROM {Follow._meta.db_table} follow
+            JOIN {Post._meta.db_table} post
+                ON post.author_id = follow.author_id
+            WHERE follow.author_id NOT IN (
+                SELECT user_id FROM {UserStats._meta.db_table}
+                WHERE followers_count >= %s
+            )
+        ) ranked
+        WHERE place <= %s
+        """,
+        [settings.TIMELINE_FANOUT_LIMIT, settings.TIMELINE_LENGTH],
+    )
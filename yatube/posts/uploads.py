@@ -0,0 +1,60 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Streams every upload to a temporary file and stops writing it once
+    it grows past ``POST_IMAGE_MAX_BYTES``.
+
+    The rest of the body is still drained from the socket, but it is never
+    kept, so a huge upload costs one chunk of memory and no disk beyond the
+    limit. ``PostForm`` turns the ``too_large`` flag into a validation error.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            self.too_large = True
+        if not self.too_large:
+            super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.too_large = self.too_large
+        return file
+
+
+def downscale(file):
+    """Returns ``file`` shrunk to fit ``POST_IMAGE_MAX_SIZE``, or ``file``
+    itself when it already fits or cannot be resized without losing frames.
+    """
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    file.seek(0)
+    with Image.open(file) as image:
+        image_format = image.format
+        if (
+            image.width <= max_size[0] and image.height <= max_size[1]
+        ) or getattr(image, 'is_animated', False):
+            file.seek(0)
+            return file
+        # JPEG can be decoded straight at a fraction of its size.
+        image.draft('RGB', max_size)
+        image.thumbnail(max_size, Image.LANCZOS)
+        image = ImageOps.exif_transpose(image)
+    buffer = BytesIO()
+    image.save(buffer, image_format, **SAVE_OPTIONS.get(image_format, {}))
+    return ContentFile(buffer.getvalue(), name=file.name)
@@ -1,43 +1,113 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
-from core.utils import paginate
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import condition
+
+from core.cache import (
+    COMMENTS_VERSION,
+    FEED_VERSION,
+    FOLLOW_VERSION,
+    get_versions,
+    versions_etag,
+)
+from core.utils import (
+    CURSOR_PARAM,
+    KeysetPaginator,
+    cached_page_number,
+    deep_page_url,
+    paginate_keyset,
+)
+from posts import search, timeline
 from posts.forms import CommentForm, PostForm
-from posts.models import Follow, Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User
+
+COMMENT_KEYS = ('created', 'id')
+
+feed_etag = versions_etag(FEED_VERSION, COMMENTS_VERSION)
+profile_etag = versions_etag(FEED_VERSION, COMMENTS_VERSION, FOLLOW_VERSION)
 
 
+@condition(etag_func=feed_etag)
 def index(request: HttpRequest) -> HttpResponse:
+    paginator = KeysetPaginator(
+        Post.objects.for_feed(),
+        settings.NUMBER_OF_POSTS,
+    )
+    url = deep_page_url(request, paginator, settings.FEED_CACHE_PAGES)
+    if url:
+        return redirect(url)
+    # Read only when the cached fragment is missing.
+    page_obj = SimpleLazyObject(lambda: paginate_keyset(request, paginator))
     return render(
         request,
         'posts/index.html',
         {
-            'page_obj': paginate(
+            'page_obj': page_obj,
+            'cached_page': cached_page_number(
                 request,
-                Post.objects.select_related('group'),
-                settings.NUMBER_OF_POSTS,
+                settings.FEED_CACHE_PAGES,
+            ),
+            # Posts show their comment counts, so both versions name it.
+            'feed_versions': ':'.join(
+                str(version)
+                for version in get_versions(FEED_VERSION, COMMENTS_VERSION)
             ),
+            'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        },
+    )
+
+
+def search_posts(request: HttpRequest) -> HttpResponse:
+    query = request.GET.get('q', '').strip()
+    page = None
+    if query:
+        paginator = search.SearchPaginator(query, settings.NUMBER_OF_POSTS)
+        page = paginator.get_page(request.GET.get(CURSOR_PARAM))
+    return render(
+        request,
+        'posts/search.html',
+        {
+            'query': query,
+            'page_obj': page,
         },
     )
 
 
+@condition(etag_func=feed_etag)
 def group_posts(request: HttpRequest, slug: str) -> HttpResponse:
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('group')
+    paginator = KeysetPaginator(
+        group.posts.for_feed(),
+        settings.NUMBER_OF_POSTS,
+    )
+    url = deep_page_url(request, paginator, settings.FEED_CACHE_PAGES)
+    if url:
+        return redirect(url)
     return render(
         request,
         'posts/group_list.html',
         {
             'group': group,
-            'page_obj': paginate(request, posts, settings.NUMBER_OF_POSTS),
+            'page_obj': paginate_keyset(request, paginator),
         },
     )
 
 
+@condition(etag_func=profile_etag)
 def profile(request: HttpRequest, username: str) -> HttpResponse:
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('author')
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username,
+    )
+    paginator = KeysetPaginator(
+        author.posts.for_feed(),
+        settings.NUMBER_OF_POSTS,
+    )
+    url = deep_page_url(request, paginator, settings.FEED_CACHE_PAGES)
+    if url:
+        return redirect(url)
     following = (
         request.user.is_authenticated
         and author.following.filter(user=request.user).exists()
@@ -47,23 +117,62 @@ def profile(request: HttpRequest, username: str) -> HttpResponse:
         'posts/profile.html',
         {
             'author': author,
-            'page_obj': paginate(request, posts, settings.NUMBER_OF_POSTS),
+            'page_obj': paginate_keyset(request, paginator),
             'following': following,
         },
     )
 
 
+def comments_page(post_id: int, cursor: str = None):
+    return KeysetPaginator(
+        Comment.objects.filter(post_id=post_id).for_listing(),
+        settings.NUMBER_OF_COMMENTS,
+        COMMENT_KEYS,
+    ).get_page(cursor)
+
+
+@condition(etag_func=feed_etag)
 def post_detail(request: HttpRequest, post_id: int) -> HttpResponse:
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id,
+    )
     return render(
         request,
         'posts/post_detail.html',
         {
-            'post': get_object_or_404(Post, pk=post_id),
+            'post': post,
+            'comments': comments_page(post.pk),
             'form': CommentForm(request.POST or None),
         },
     )
 
 
+def post_comments(request: HttpRequest, post_id: int) -> HttpResponse:
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = comments_page(post_id, request.GET.get(CURSOR_PARAM))
+    if request.GET.get('format') == 'json':
+        return JsonResponse(
+            {
+                'results': [
+                    {
+                        'id': comment.pk,
+                        'author': comment.author.username,
+                        'text': comment.text,
+                        'created': comment.created,
+                    }
+                    for comment in comments
+                ],
+                'next': comments.next_cursor or None,
+            },
+        )
+    return render(
+        request,
+        'includes/comments_page.html',
+        {'post_id': post_id, 'comments': comments},
+    )
+
+
 @login_required
 def post_create(request: HttpRequest) -> HttpResponse:
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -111,8 +220,11 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page = paginate(request, posts, settings.NUMBER_OF_POSTS)
+    paginator = timeline.FeedPaginator(request.user, settings.NUMBER_OF_POSTS)
+    url = deep_page_url(request, paginator, settings.FEED_CACHE_PAGES)
+    if url:
+        return redirect(url)
+    page = paginate_keyset(request, paginator)
     return render(request, 'posts/follow.html', {'page_obj': page})
 
 
@@ -1,4 +1,7 @@
 import os
+from importlib.util import find_spec
+
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -8,9 +11,41 @@ DEBUG = True
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+CACHE_BACKENDS = {
+    'locmem': ('core.cache_backends.LocMemCache', ''),
+    'file': (
+        'core.cache_backends.FileBasedCache',
+        os.path.join(BASE_DIR, 'var', 'cache'),
+    ),
+    'sqlite': (
+        'core.cache_backends.SharedSQLiteCache',
+        os.path.join(BASE_DIR, 'var', 'cache.sqlite3'),
+    ),
+    'memcached': ('core.cache_backends.MemcachedCache', '127.0.0.1:11211'),
+    'redis': ('core.cache_backends.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+
+CACHE_BACKEND = os.getenv('YATUBE_CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'redis' and find_spec('django_redis') is None:
+    CACHE_BACKEND = 'sqlite'
+
+if CACHE_BACKEND == 'memcached' and find_spec('memcache') is None:
+    CACHE_BACKEND = 'sqlite'
+
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f'Неизвестный YATUBE_CACHE_BACKEND {CACHE_BACKEND!r}, '
+        f'допустимы: {", ".join(CACHE_BACKENDS)}.',
+    )
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv(
+            'YATUBE_CACHE_LOCATION',
+            CACHE_BACKENDS[CACHE_BACKEND][1],
+        ),
     },
 }
 
@@ -39,7 +74,9 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'core.apps.CoreConfig',
+    'jobs.apps.JobsConfig',
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'sorl.thumbnail',
@@ -52,10 +89,14 @@ INTERNAL_IPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CacheStatsMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -71,7 +112,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -92,9 +133,62 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     },
 }
 
+# Read replicas: YATUBE_DB_REPLICAS lists comma-separated SQLite files kept
+# in sync with the main one. Tests run them as mirrors of the main database.
+REPLICA_PATHS = [
+    path for path in os.getenv('YATUBE_DB_REPLICAS', '').split(',') if path
+]
+
+DATABASE_REPLICAS = [
+    f'replica{number}' for number in range(1, len(REPLICA_PATHS) + 1)
+]
+
+DATABASES.update(
+    {
+        alias: {
+            **DATABASES['default'],
+            'NAME': os.path.join(BASE_DIR, path),
+            'TEST': {'MIRROR': 'default'},
+        }
+        for alias, path in zip(DATABASE_REPLICAS, REPLICA_PATHS)
+    },
+)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:post_comments',
+    'posts:follow_index',
+    'api:posts',
+    'api:post_detail',
+    'api:post_comments',
+    'api:groups',
+    'api:feed',
+    'api:follows',
+)
+
+REPLICA_PIN_SECONDS = 10
+
+# Applied to every new SQLite connection, see core.db. WAL lets readers
+# work while a request writes; NORMAL sync is durable in WAL mode except
+# for the last commits on power loss. cache_size is in KiB when negative.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5_000,
+    'mmap_size': 256 * 2**20,
+    'cache_size': -64_000,
+    'temp_store': 'MEMORY',
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -123,3 +217,109 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 STATIC_URL = '/static/'
 
 NUMBER_OF_POSTS = 10
+
+TIMELINE_FANOUT_LIMIT = 10_000
+
+# Followers an author may lose below the limit and still be read as
+# popular, until the job copying their posts into timelines has run.
+TIMELINE_FANOUT_MARGIN = 100
+
+TIMELINE_LENGTH = 1_000
+
+TIMELINE_BATCH_SIZE = 500
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 4
+
+# Pages of the index kept in the fragment cache; deeper and cursor pages
+# are cheap range reads and are rendered every time.
+FEED_CACHE_PAGES = 10
+
+NUMBER_OF_COMMENTS = 20
+
+THUMBNAIL_WIDTHS = (320, 640, 960)
+
+THUMBNAIL_SIZES = '(min-width: 768px) 720px, 100vw'
+
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
+
+POST_IMAGE_MAX_BYTES = 10 * 2**20
+
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+POST_IMAGE_MAX_SIZE = (2560, 2560)
+
+SEARCH_FTS = True
+
+INGEST_CHUNK_SIZE = 1_000
+
+EXPORT_CHUNK_SIZE = 2_000
+
+IMPORT_CHUNK_SIZE = 5_000
+
+DATASET_CHUNK_SIZE = 20_000
+
+# The benchmark command runs on a copy of this dataset, generated once
+# into BENCHMARK_DIR, and compares its figures with BENCHMARK_BASELINE.
+BENCHMARK_DATASET = {
+    'users': 2_000,
+    'posts': 50_000,
+    'comments': 100_000,
+    'follows': 20_000,
+    'groups': 20,
+    'images': 0.1,
+    'seed': 0,
+    'timelines': True,
+}
+
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'var', 'benchmark')
+
+BENCHMARK_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+
+BENCHMARK_TOLERANCE = 0.25
+
+JOBS_WORKERS = 2
+
+JOBS_POLL_INTERVAL = 1
+
+JOBS_LOCK_TIMEOUT = 60 * 10
+
+JOBS_MAX_ATTEMPTS = 5
+
+JOBS_RETRY_DELAY = 10
+
+JOBS_MAX_RETRY_DELAY = 60 * 60
+
+JOBS_KEEP_DONE = 60 * 60 * 24 * 7
+
+# Dotted path of a job and its interval in seconds.
+JOBS_PERIODIC = {
+    'posts.counters.reconcile': 60 * 60 * 24,
+    'jobs.queue.prune': 60 * 60,
+}
+
+METRICS_DIR = os.path.join(BASE_DIR, 'var', 'metrics')
+
+METRICS_FLUSH_INTERVAL = 10
+
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
+# Query statistics cost a wrapper call per query and an EXPLAIN per slow
+# query shape, so they are collected only on request.
+SQL_STATS = os.getenv('YATUBE_SQL_STATS') == '1'
+
+SQL_STATS_DIR = os.path.join(BASE_DIR, 'var', 'sqlstats')
+
+SQL_STATS_FLUSH_INTERVAL = 10
+
+SQL_SLOW_QUERY_MS = 100
+
+PAGE_CACHE_TIMEOUT = 60
+
+PAGE_CACHE_STALE_TIMEOUT = 60 * 5
+
+PAGE_CACHE_VIEWS = {
+    'posts:index': ('feed', 'comments'),
+    'posts:group_list': ('feed', 'comments'),
+    'posts:profile': ('feed', 'comments', 'follow'),
+    'posts:post_detail': ('feed', 'comments'),
+}
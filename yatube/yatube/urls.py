@@ -4,6 +4,8 @@ from django.contrib import admin
 from django.urls import include, path
 
 from about.apps import AboutConfig
+from api.apps import ApiConfig
+from core.views import prometheus_metrics
 from posts.apps import PostsConfig
 from users.apps import UsersConfig
 
@@ -15,8 +17,10 @@ urlpatterns = [
     path('', include('posts.urls', namespace=PostsConfig.name)),
     path('about/', include('about.urls', namespace=AboutConfig.name)),
     path('admin/', admin.site.urls),
+    path('api/v1/', include('api.urls', namespace=ApiConfig.name)),
     path('auth/', include('users.urls', namespace=UsersConfig.name)),
     path('auth/', include('django.contrib.auth.urls')),
+    path('metrics/', prometheus_metrics, name='metrics'),
 ]
 
 if settings.DEBUG: